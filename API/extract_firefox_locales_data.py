@@ -1,10 +1,24 @@
 #!/usr/bin/env python3
 
+from pontoon_api import add_cache_arguments, create_client
+from report_output import add_output_arguments, open_report
+from snapshot import load_snapshot
+import argparse
 import requests
 import sys
 
 
 def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--snapshot",
+        required=False,
+        help="Path to snapshot file (see snapshot.py) to read instead of the API",
+    )
+    add_cache_arguments(parser)
+    add_output_arguments(parser)
+    args = parser.parse_args()
+
     locales = [
         "ach",
         "af",
@@ -103,52 +117,54 @@ def main():
         "zh-TW",
     ]
 
-    url = "https://pontoon.mozilla.org/api/v2/locales/?fields=code,projects,missing_strings,unreviewed_strings"
-    page = 1
+    if args.snapshot:
+        pontoon_locales = load_snapshot(args.snapshot).locales
+    else:
+        try:
+            with create_client(args) as client:
+                pontoon_locales = list(
+                    client.paginate(
+                        "locales/",
+                        description="locales",
+                        fields="code,projects,missing_strings,unreviewed_strings",
+                    )
+                )
+        except requests.RequestException as e:
+            print(f"Error fetching data: {e}")
+            sys.exit()
     locale_stats = {}
-    try:
-        while url:
-            print(f"Reading locales (page {page})")
-            response = requests.get(url)
-            response.raise_for_status()
-            data = response.json()
-
-            for locale in data.get("results", {}):
-                if locale["code"] not in locales:
-                    continue
+    for locale in pontoon_locales:
+        if locale["code"] not in locales:
+            continue
 
-                locale_stats[locale["code"]] = {
-                    "projects": sorted(locale["projects"]),
-                    "missing": locale["missing_strings"],
-                    "unreviewed": locale["unreviewed_strings"],
-                }
-
-            # Get the next page URL
-            url = data.get("next")
-            page += 1
-    except requests.RequestException as e:
-        print(f"Error fetching data: {e}")
-        sys.exit()
+        locale_stats[locale["code"]] = {
+            "projects": sorted(locale["projects"]),
+            "missing": locale["missing_strings"],
+            "unreviewed": locale["unreviewed_strings"],
+        }
 
     locale_stats = dict(sorted(locale_stats.items()))
-    output = []
-    output.append(
-        "Locale,Number of Projects,Projects,Missing Strings,Pending Suggestions,Latest Activity"
-    )
-    for locale, locale_data in locale_stats.items():
-        output.append(
-            "{},{},{},{},{},".format(
-                locale,
-                len(locale_data["projects"]),
-                " ".join(locale_data["projects"]),
-                locale_data["missing"],
-                locale_data["unreviewed"],
+    fields = [
+        "Locale",
+        "Number of Projects",
+        "Projects",
+        "Missing Strings",
+        "Pending Suggestions",
+        "Latest Activity",
+    ]
+    types = [str, int, str, int, int, str]
+    with open_report(args, fields, types) as report:
+        for locale, locale_data in locale_stats.items():
+            report.write(
+                [
+                    locale,
+                    len(locale_data["projects"]),
+                    " ".join(locale_data["projects"]),
+                    locale_data["missing"],
+                    locale_data["unreviewed"],
+                    "",
+                ]
             )
-        )
-    # Save locally
-    with open("output.csv", "w") as f:
-        f.write("\n".join(output))
-        print("Data stored as output.csv")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,141 @@
+"""
+Client for GitHub's REST API, used by missing_locales.py.
+
+Like PontoonClient, it's based on APIClient (pontoon_api.py), so both clients
+can share a session, the response cache and the limit of concurrent requests.
+It follows GitHub's rate limits:
+- requests are authenticated with the token in GITHUB_TOKEN if set (5,000
+  requests per hour instead of 60);
+- the remaining quota is read from the X-RateLimit-* headers of each response,
+  and once exhausted, requests wait for X-RateLimit-Reset (up to `max_wait`
+  seconds) instead of failing;
+- secondary rate limits (403 or 429 with Retry-After) are retried after the
+  requested delay;
+- a request is attempted `max_retries` times at most, RateLimitError is raised
+  if it's still rate limited. Only server errors (5xx) are retried by the
+  session, with its own adapter for GitHub's URLs, even if the session is
+  shared with PontoonClient.
+Cached responses are revalidated with conditional requests, which don't count
+against the rate limit when the content didn't change.
+
+Usage:
+    from github_api import GitHubClient
+
+    with GitHubClient(token=os.environ.get("GITHUB_TOKEN")) as client:
+        listing = client.get("repos/mozilla-l10n/firefox-l10n/contents/")
+"""
+
+from pontoon_api import APIClient, create_adapter
+import requests
+import sys
+import threading
+import time
+
+GITHUB_API_URL = "https://api.github.com/"
+
+# Maximum number of seconds to wait for the rate limit to reset
+MAX_WAIT = 900
+
+# Maximum number of attempts of a rate limited request
+MAX_RETRIES = 5
+
+# Status codes retried with backoff by the session, rate limits (403 and 429)
+# are handled by GitHubClient
+GITHUB_RETRY_STATUS = [500, 502, 503, 504]
+
+
+class RateLimitError(requests.RequestException):
+    """
+    Raised when the rate limit resets after more than `max_wait` seconds, or
+    when a request is still rate limited after `max_retries` attempts.
+    """
+
+
+class GitHubClient(APIClient):
+    def __init__(
+        self,
+        base_url=GITHUB_API_URL,
+        token=None,
+        max_wait=MAX_WAIT,
+        max_retries=MAX_RETRIES,
+        **kwargs,
+    ):
+        super().__init__(base_url, **kwargs)
+        # The session can be shared with PontoonClient: its adapter retries
+        # 429 responses, replaced for GitHub's URLs by an adapter which
+        # leaves them to request(), so that max_wait and max_retries apply
+        self.session.mount(
+            base_url,
+            create_adapter(
+                pool_size=max(10, self.concurrency),
+                retry_status=GITHUB_RETRY_STATUS,
+                retry_after=False,
+            ),
+        )
+        self.headers = {
+            "Accept": "application/vnd.github+json",
+            "X-GitHub-Api-Version": "2022-11-28",
+        }
+        if token:
+            self.headers["Authorization"] = f"Bearer {token}"
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+        # Shared by all threads: when the quota is exhausted, they all wait
+        self.rate_limit_lock = threading.Lock()
+        self.remaining = None
+        self.reset = 0
+
+    def wait(self, seconds, reason):
+        if seconds > self.max_wait:
+            raise RateLimitError(
+                f"{reason}, retry in {seconds:.0f} seconds"
+                + ("" if "Authorization" in self.headers else " or set GITHUB_TOKEN")
+            )
+        print(f"{reason}, waiting {seconds:.0f} seconds", file=sys.stderr)
+        time.sleep(seconds)
+
+    def wait_for_rate_limit(self):
+        with self.rate_limit_lock:
+            if self.remaining == 0:
+                self.wait(
+                    max(self.reset - time.time(), 0) + 1, "GitHub rate limit reached"
+                )
+                self.remaining = None
+
+    def update_rate_limit(self, response):
+        remaining = response.headers.get("X-RateLimit-Remaining")
+        reset = response.headers.get("X-RateLimit-Reset")
+        if remaining is None or reset is None:
+            return
+        with self.rate_limit_lock:
+            self.remaining = int(remaining)
+            self.reset = int(reset)
+
+    def request(self, url, headers=None):
+        headers = {**self.headers, **(headers or {})}
+        delay = 0
+        for _ in range(self.max_retries):
+            if delay:
+                self.wait(delay, "GitHub secondary rate limit reached")
+            self.wait_for_rate_limit()
+            with self.slots:
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+            self.update_rate_limit(response)
+            if response.status_code not in (403, 429):
+                break
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                delay = int(retry_after)
+            elif response.headers.get("X-RateLimit-Remaining") == "0":
+                # wait_for_rate_limit() waits for the reset before the next attempt
+                delay = 0
+            else:
+                # Forbidden for another reason
+                break
+        else:
+            raise RateLimitError(
+                f"GitHub rate limit still reached after {self.max_retries} attempts"
+            )
+        response.raise_for_status()
+
+        return response
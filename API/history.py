@@ -0,0 +1,493 @@
+#!/usr/bin/env python3
+
+"""
+Store the statistics of each snapshot (see snapshot.py) in a local history,
+to compare locales and projects over time.
+
+The history is a SQLite database, stored in ~/.local/share/pontoon-scripts/
+by default (or in $XDG_DATA_HOME/pontoon-scripts/). Each snapshot is stored
+as one row per project (plus one row for locale totals), where each field is
+a zlib compressed array of integers: locale and project codes are stored once
+in dictionary tables and referenced by ID. A daily snapshot of all locales
+takes a few KB, and a comparison only decodes the two snapshots involved.
+
+snapshot.py appends each snapshot to the history. Existing snapshot files can
+be imported with the `import` command.
+
+Usage:
+    python history.py list
+    python history.py import snapshot.jsonl.gz
+    python history.py diff
+    python history.py diff --from 2024-01-01 --to 2024-06-30 --by-project --output diff.csv
+"""
+
+from array import array
+from collections import namedtuple
+from report_output import add_output_arguments, open_report
+import argparse
+import os
+import sqlite3
+import sys
+import zlib
+
+# Fields of localizations (projects/<slug>/) and locales stored in the history
+LOCALIZATION_FIELDS = [
+    "total_strings",
+    "approved_strings",
+    "pretranslated_strings",
+    "strings_with_warnings",
+    "strings_with_errors",
+    "missing_strings",
+    "unreviewed_strings",
+]
+LOCALE_FIELDS = ["missing_strings", "unreviewed_strings"]
+
+SnapshotInfo = namedtuple("SnapshotInfo", ["id", "created", "source"])
+
+
+def default_history_path():
+    data_root = os.environ.get("XDG_DATA_HOME") or os.path.join(
+        os.path.expanduser("~"), ".local", "share"
+    )
+
+    return os.path.join(data_root, "pontoon-scripts", "history.sqlite")
+
+
+def pack(values):
+    """Return a list of integers as a compressed array (little-endian int64)."""
+
+    values = array("q", values)
+    if sys.byteorder == "big":
+        values.byteswap()
+
+    return zlib.compress(values.tobytes())
+
+
+def unpack(blob):
+    values = array("q")
+    values.frombytes(zlib.decompress(blob))
+    if sys.byteorder == "big":
+        values.byteswap()
+
+    return values
+
+
+def placeholders(count):
+    return ", ".join("?" * count)
+
+
+def completion(stats):
+    """Return the completion percentage of statistics, as in the health report."""
+
+    if not stats.get("total_strings"):
+        return 0
+
+    return round(
+        (stats["approved_strings"] + stats["strings_with_warnings"])
+        / stats["total_strings"]
+        * 100,
+        2,
+    )
+
+
+class HistoryStore:
+    def __init__(self, fp=None):
+        self.fp = fp or default_history_path()
+        if self.fp != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.fp)), exist_ok=True)
+        self.connection = sqlite3.connect(self.fp)
+        localization_columns = ", ".join(f"{f} BLOB" for f in LOCALIZATION_FIELDS)
+        locale_columns = ", ".join(f"{f} BLOB" for f in LOCALE_FIELDS)
+        with self.connection:
+            self.connection.executescript(f"""
+                CREATE TABLE IF NOT EXISTS snapshots (
+                    id INTEGER PRIMARY KEY,
+                    created TEXT NOT NULL UNIQUE,
+                    source TEXT
+                );
+                CREATE TABLE IF NOT EXISTS locales (
+                    id INTEGER PRIMARY KEY,
+                    code TEXT NOT NULL UNIQUE
+                );
+                CREATE TABLE IF NOT EXISTS projects (
+                    id INTEGER PRIMARY KEY,
+                    slug TEXT NOT NULL UNIQUE
+                );
+                CREATE TABLE IF NOT EXISTS locale_stats (
+                    snapshot_id INTEGER PRIMARY KEY REFERENCES snapshots (id),
+                    locale_ids BLOB NOT NULL,
+                    {locale_columns}
+                );
+                CREATE TABLE IF NOT EXISTS localization_stats (
+                    snapshot_id INTEGER NOT NULL REFERENCES snapshots (id),
+                    project_id INTEGER NOT NULL REFERENCES projects (id),
+                    locale_ids BLOB NOT NULL,
+                    {localization_columns},
+                    PRIMARY KEY (snapshot_id, project_id)
+                );
+                """)
+        self.locale_codes = dict(
+            self.connection.execute("SELECT id, code FROM locales")
+        )
+        self.locale_ids = {code: id for id, code in self.locale_codes.items()}
+        self.project_slugs = dict(
+            self.connection.execute("SELECT id, slug FROM projects")
+        )
+        self.project_ids = {slug: id for id, slug in self.project_slugs.items()}
+
+    def code_id(self, table, column, value, ids, names):
+        if value not in ids:
+            cursor = self.connection.execute(
+                f"INSERT INTO {table} ({column}) VALUES (?)", (value,)
+            )
+            ids[value] = cursor.lastrowid
+            names[cursor.lastrowid] = value
+
+        return ids[value]
+
+    def locale_id(self, code):
+        return self.code_id("locales", "code", code, self.locale_ids, self.locale_codes)
+
+    def project_id(self, slug):
+        return self.code_id(
+            "projects", "slug", slug, self.project_ids, self.project_slugs
+        )
+
+    def append(self, created, locales, localizations, source=None):
+        """
+        Store a snapshot, with `locales` and `localizations` records as in
+        snapshot.py. Return its ID, or None if a snapshot with the same
+        creation time is already stored.
+        """
+
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT OR IGNORE INTO snapshots (created, source) VALUES (?, ?)",
+                (created, source),
+            )
+            if not cursor.rowcount:
+                return None
+            snapshot_id = cursor.lastrowid
+
+            locales = sorted(locales, key=lambda record: record["code"])
+            self.connection.execute(
+                "INSERT INTO locale_stats "
+                f"VALUES ({placeholders(len(LOCALE_FIELDS) + 2)})",
+                [
+                    snapshot_id,
+                    pack(self.locale_id(record["code"]) for record in locales),
+                ]
+                + [
+                    pack(record.get(field) or 0 for record in locales)
+                    for field in LOCALE_FIELDS
+                ],
+            )
+
+            projects = {}
+            for record in localizations:
+                projects.setdefault(record["project"], []).append(record)
+            for project, records in projects.items():
+                records.sort(key=lambda record: record["locale"])
+                self.connection.execute(
+                    "INSERT INTO localization_stats "
+                    f"VALUES ({placeholders(len(LOCALIZATION_FIELDS) + 3)})",
+                    [
+                        snapshot_id,
+                        self.project_id(project),
+                        pack(self.locale_id(record["locale"]) for record in records),
+                    ]
+                    + [
+                        pack(record.get(field) or 0 for record in records)
+                        for field in LOCALIZATION_FIELDS
+                    ],
+                )
+
+        return snapshot_id
+
+    def snapshots(self):
+        return [
+            SnapshotInfo(*row)
+            for row in self.connection.execute(
+                "SELECT id, created, source FROM snapshots ORDER BY created"
+            )
+        ]
+
+    def find_snapshot(self, reference):
+        """
+        Return the SnapshotInfo matching `reference`: an ID, or a date (or
+        datetime prefix, e.g. a year) for the last snapshot created until
+        then. Numbers are read as dates if there's no snapshot with that ID.
+        """
+
+        row = None
+        if reference.isdigit():
+            row = self.connection.execute(
+                "SELECT id, created, source FROM snapshots WHERE id = ?",
+                (int(reference),),
+            ).fetchone()
+        if row is None:
+            # Compare prefixes, "2024-05-01" includes all that day
+            row = self.connection.execute(
+                "SELECT id, created, source FROM snapshots "
+                "WHERE substr(created, 1, ?) <= ? ORDER BY created DESC LIMIT 1",
+                (len(reference), reference),
+            ).fetchone()
+
+        return SnapshotInfo(*row) if row else None
+
+    def locale_stats(self, snapshot_id):
+        """Return {locale: {field: value}} of locales in a snapshot."""
+
+        row = self.connection.execute(
+            f"SELECT locale_ids, {', '.join(LOCALE_FIELDS)} FROM locale_stats "
+            "WHERE snapshot_id = ?",
+            (snapshot_id,),
+        ).fetchone()
+        if not row:
+            return {}
+
+        columns = [unpack(blob) for blob in row]
+        return {
+            self.locale_codes[locale_id]: dict(zip(LOCALE_FIELDS, values))
+            for locale_id, *values in zip(*columns)
+        }
+
+    def localization_stats(self, snapshot_id, projects=None):
+        """
+        Return {(project, locale): {field: value}} of localizations in a
+        snapshot, optionally limited to a list of projects.
+        """
+
+        stats = {}
+        for project_id, *blobs in self.connection.execute(
+            f"SELECT project_id, locale_ids, {', '.join(LOCALIZATION_FIELDS)} "
+            "FROM localization_stats WHERE snapshot_id = ?",
+            (snapshot_id,),
+        ):
+            project = self.project_slugs[project_id]
+            if projects and project not in projects:
+                continue
+            columns = [unpack(blob) for blob in blobs]
+            for locale_id, *values in zip(*columns):
+                stats[(project, self.locale_codes[locale_id])] = dict(
+                    zip(LOCALIZATION_FIELDS, values)
+                )
+
+        return stats
+
+    def close(self):
+        self.connection.close()
+
+
+def locale_totals(store, snapshot_id, projects=None):
+    """
+    Return {(None, locale): {field: value}}, summing localizations of all
+    projects. Without `projects`, missing and unreviewed strings are the totals
+    of the locale across all projects in Pontoon, not only the ones in the
+    snapshot.
+    """
+
+    totals = {}
+    for (_, locale), stats in store.localization_stats(snapshot_id, projects).items():
+        locale_stats = totals.setdefault(locale, dict.fromkeys(LOCALIZATION_FIELDS, 0))
+        for field in LOCALIZATION_FIELDS:
+            locale_stats[field] += stats[field]
+    if not projects:
+        for locale, values in store.locale_stats(snapshot_id).items():
+            totals.setdefault(locale, dict.fromkeys(LOCALIZATION_FIELDS, 0)).update(
+                values
+            )
+
+    return {(None, locale): stats for locale, stats in totals.items()}
+
+
+def diff_snapshots(store, old_id, new_id, by_project=False, projects=None):
+    """
+    Return a sorted list of rows comparing two snapshots, for each locale (or
+    each project and locale with `by_project`): completion, missing and
+    unreviewed strings, before and after. Locales or projects missing from a
+    snapshot are counted as 0.
+    """
+
+    if by_project:
+        old = store.localization_stats(old_id, projects)
+        new = store.localization_stats(new_id, projects)
+    else:
+        old = locale_totals(store, old_id, projects)
+        new = locale_totals(store, new_id, projects)
+
+    empty = dict.fromkeys(LOCALIZATION_FIELDS, 0)
+    rows = []
+    for key in sorted(old.keys() | new.keys()):
+        before = old.get(key, empty)
+        after = new.get(key, empty)
+        rows.append(
+            {
+                "project": key[0],
+                "locale": key[1],
+                "completion_before": completion(before),
+                "completion_after": completion(after),
+                "completion_change": round(completion(after) - completion(before), 2),
+                "missing_before": before["missing_strings"],
+                "missing_after": after["missing_strings"],
+                "missing_change": after["missing_strings"] - before["missing_strings"],
+                "unreviewed_before": before["unreviewed_strings"],
+                "unreviewed_after": after["unreviewed_strings"],
+                "unreviewed_change": after["unreviewed_strings"]
+                - before["unreviewed_strings"],
+            }
+        )
+
+    return rows
+
+
+def import_snapshot(store, fp):
+    # Imported here, snapshot.py imports this module
+    from snapshot import Snapshot
+
+    snapshot = Snapshot(fp)
+    localizations = [
+        record for records in snapshot.localizations.values() for record in records
+    ]
+
+    return store.append(
+        snapshot.created, snapshot.locales, localizations, os.path.basename(fp)
+    )
+
+
+def print_diff(rows, old, new, by_project):
+    print(f"Changes from snapshot {old.id} ({old.created}) to {new.id} ({new.created})")
+    header = f"{'Locale':<12} "
+    if by_project:
+        header = f"{'Project':<28} " + header
+    print(
+        header + f"{'Completion':>19} {'Change':>8} {'Missing':>9} {'Change':>8} "
+        f"{'Unreviewed':>11} {'Change':>8}"
+    )
+    for row in rows:
+        line = f"{row['locale']:<12} "
+        if by_project:
+            line = f"{row['project']:<28} " + line
+        print(
+            line
+            + f"{row['completion_before']:>8.2f} -> {row['completion_after']:>6.2f} "
+            f"{row['completion_change']:>+8.2f} {row['missing_after']:>9} "
+            f"{row['missing_change']:>+8} {row['unreviewed_after']:>11} "
+            f"{row['unreviewed_change']:>+8}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--history",
+        required=False,
+        default=None,
+        help="Path to the history database (default: ~/.local/share/pontoon-scripts/history.sqlite)",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("list", help="List stored snapshots")
+    import_parser = subparsers.add_parser(
+        "import", help="Store snapshot files created by snapshot.py"
+    )
+    import_parser.add_argument("snapshot_files", nargs="+", help="Snapshot files")
+    diff_parser = subparsers.add_parser("diff", help="Compare two snapshots")
+    diff_parser.add_argument(
+        "--from",
+        required=False,
+        dest="old",
+        help="Snapshot ID or date to compare from (default: second to last)",
+    )
+    diff_parser.add_argument(
+        "--to",
+        required=False,
+        dest="new",
+        help="Snapshot ID or date to compare to (default: last)",
+    )
+    diff_parser.add_argument(
+        "--by-project",
+        required=False,
+        action="store_true",
+        default=False,
+        help="Compare each project and locale, instead of locales",
+    )
+    diff_parser.add_argument(
+        "--project",
+        required=False,
+        action="append",
+        dest="projects",
+        help="Only compare this project (can be repeated)",
+    )
+    diff_parser.add_argument(
+        "--locale",
+        required=False,
+        action="append",
+        dest="locales",
+        help="Only compare this locale (can be repeated)",
+    )
+    add_output_arguments(diff_parser, default=None)
+    args = parser.parse_args()
+
+    store = HistoryStore(args.history)
+    if args.command == "list":
+        for snapshot in store.snapshots():
+            print(f"{snapshot.id:>6} {snapshot.created} {snapshot.source or ''}")
+    elif args.command == "import":
+        for fp in args.snapshot_files:
+            try:
+                snapshot_id = import_snapshot(store, fp)
+            except FileNotFoundError:
+                sys.exit(f"File {fp} doesn't exist.")
+            if snapshot_id is None:
+                print(f"Snapshot {fp} is already stored")
+            else:
+                print(f"Snapshot {fp} stored as {snapshot_id}")
+    else:
+        snapshots = store.snapshots()
+        if len(snapshots) < 2 and not (args.old and args.new):
+            sys.exit("At least two snapshots are needed, see snapshot.py.")
+        old = store.find_snapshot(args.old) if args.old else snapshots[-2]
+        new = store.find_snapshot(args.new) if args.new else snapshots[-1]
+        if old is None or new is None:
+            sys.exit(f"Snapshot {args.old if old is None else args.new} not found.")
+
+        rows = diff_snapshots(store, old.id, new.id, args.by_project, args.projects)
+        if args.locales:
+            rows = [row for row in rows if row["locale"] in args.locales]
+        # The table is replaced by the report on the standard output
+        if args.output != "-":
+            print_diff(rows, old, new, args.by_project)
+
+        if args.output:
+            fields = [
+                "project",
+                "locale",
+                "completion_before",
+                "completion_after",
+                "completion_change",
+                "missing_before",
+                "missing_after",
+                "missing_change",
+                "unreviewed_before",
+                "unreviewed_after",
+                "unreviewed_change",
+            ]
+            if not args.by_project:
+                fields.remove("project")
+            types = [
+                (
+                    str
+                    if field in ("project", "locale")
+                    else float if field.startswith("completion") else int
+                )
+                for field in fields
+            ]
+            with open_report(args, fields, types) as report:
+                for row in rows:
+                    report.write([row[field] for field in fields])
+
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
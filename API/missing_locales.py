@@ -1,81 +1,190 @@
 """
 Retrieves a list of locales missing in Pontoon for a single project by comparing with GitHub repo.
 
-Output as CSV file with column Missing Locales.
+Output as CSV file with column Missing Locales (see --csv, --output and
+--format).
 
+In batch mode (--manifest), all projects of a manifest are checked at once and
+a single report is stored (output.csv by default), with missing and ignored
+locales for each project. The manifest is a CSV file with columns pontoon,
+repo, owner and path (owner and path are optional, see --owner and --path), or
+a JSON file with a list of objects with the same keys.
+
+Pontoon projects and GitHub folders are read in parallel over shared
+connections, and responses are cached (see --refresh and --offline). Set
+GITHUB_TOKEN to raise GitHub's rate limit, requests wait for the limit to
+reset when it's reached.
+
+Usage:
+    python missing_locales.py --pontoon firefox-monitor-website --repo monitor-website-l10n
+    python missing_locales.py --manifest projects.csv --output missing.csv
 """
 
+from concurrent.futures import ThreadPoolExecutor
+from github_api import GitHubClient
+from pontoon_api import (
+    DEFAULT_CONCURRENCY,
+    add_cache_arguments,
+    create_client,
+    create_session,
+)
+from report_output import add_output_arguments, open_report
 import argparse
+import csv
+import json
+import os
 import requests
 import sys
 from urllib.parse import quote as urlquote
 
+# Errors reported for a project in batch mode, instead of stopping the script:
+# failed requests, invalid JSON or unexpected data
+FETCH_ERRORS = (requests.RequestException, ValueError)
+
+
+def read_pontoon_locales(client, project):
+    locales = list(
+        client.paginate(
+            f"projects/{project}/",
+            key="locales",
+            description=f"locales for {project}",
+            fields="locales",
+        )
+    )
+    locales.sort()
+
+    return locales
 
-def retrieve_pontoon_locales(project):
-    try:
-        url = f"https://pontoon.mozilla.org/api/v2/projects/{project}/?fields=locales"
-        page = 1
-        locales = []
-        while url:
-            print(f"Reading locales for {project} (page {page})")
-            response = requests.get(url)
-            response.raise_for_status()
-            data = response.json()
-            locales.extend(data.get("locales", []))
-
-            # Get the next page URL
-            url = data.get("next")
-            page += 1
-        locales.sort()
-
-        return locales
-    except requests.RequestException as e:
-        print(f"Error fetching data: {e}")
-        sys.exit()
-
-
-def retrieve_github_locales(owner, repo, path):
-    query = f"/repos/{owner}/{repo}/contents/{urlquote(path)}"
-    url = f"https://api.github.com{query}"
 
+def read_github_locales(client, owner, repo, path):
     ignored_folders = ["templates", "configs"]
 
+    json_data = client.get(f"repos/{owner}/{repo}/contents/{urlquote(path)}")
+    if not isinstance(json_data, list):
+        raise ValueError(f"{path or '/'} is not a folder of {owner}/{repo}")
+
+    # Ignore files, hidden folder, non-locale folders via ignore list
+    locale_list = [
+        e["name"]
+        for e in json_data
+        if e["type"] == "dir"
+        and not e["name"].startswith(".")
+        and e["name"] not in ignored_folders
+    ]
+    # Use hyphens instead of underscores for locale codes
+    locale_list = [locale.replace("_", "-") for locale in locale_list]
+    locale_list.sort()
+
+    return locale_list
+
+
+def compare_locales(pontoon_locales, github_locales):
+    """Return (missing locales, ignored locales) of a project."""
+
+    missing_locales = list(set(github_locales) - set(pontoon_locales))
+    missing_locales.sort()
+
+    # Clean up possible false positives
+    locales_without_region = [loc.split("-")[0] for loc in pontoon_locales]
+    ignored_locales = []
+    for locale in missing_locales[:]:
+        if locale in ["en-US", "en"] + locales_without_region:
+            missing_locales.remove(locale)
+            ignored_locales.append(locale)
+
+    return missing_locales, ignored_locales
+
+
+def read_manifest(fp, default_owner, default_path):
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        json_data = response.json()
-
-        # Ignore files, hidden folder, non-locale folders via ignore list
-        locale_list = [
-            e["name"]
-            for e in json_data
-            if e["type"] == "dir"
-            and not e["name"].startswith(".")
-            and e["name"] not in ignored_folders
-        ]
-        # Use hyphens instead of underscores for locale codes
-        locale_list = [locale.replace("_", "-") for locale in locale_list]
-        locale_list.sort()
+        with open(fp, newline="", encoding="utf-8") as f:
+            rows = json.load(f) if fp.endswith(".json") else list(csv.DictReader(f))
+    except FileNotFoundError:
+        sys.exit(f"File {fp} doesn't exist.")
+    except ValueError as e:
+        sys.exit(f"Error reading {fp}: {e}")
+
+    entries = []
+    for index, row in enumerate(rows, 1):
+        row = {key: (value or "").strip() for key, value in row.items() if key}
+        if not row.get("pontoon") or not row.get("repo"):
+            sys.exit(f"Entry {index} of {fp} requires both pontoon and repo.")
+        entries.append(
+            {
+                "pontoon": row["pontoon"],
+                "repo": row["repo"],
+                "owner": row.get("owner") or default_owner,
+                "path": row.get("path") or default_path,
+            }
+        )
+
+    return entries
 
-        return locale_list
-    except Exception as e:
-        sys.exit(f"GitHub error: {e}")
+
+def check_entries(pontoon_client, github_client, entries):
+    """
+    Return a result for each entry, with missing and ignored locales, or the
+    error that prevented the comparison.
+    """
+
+    def fetch(source, function, *args):
+        # Errors of both APIs are handled the same way
+        try:
+            return function(*args), None
+        except FETCH_ERRORS as e:
+            return None, f"{source} error: {e}"
+
+    def pontoon_locales(project):
+        return fetch("Pontoon", read_pontoon_locales, pontoon_client, project)
+
+    def github_locales(entry):
+        return fetch(
+            "GitHub",
+            read_github_locales,
+            github_client,
+            entry["owner"],
+            entry["repo"],
+            entry["path"],
+        )
+
+    # Each Pontoon project is read once, at the same time as GitHub folders
+    projects = sorted({entry["pontoon"] for entry in entries})
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        pontoon_future = executor.submit(pontoon_client.map, pontoon_locales, projects)
+        github_results = github_client.map(github_locales, entries)
+        pontoon_results = dict(zip(projects, pontoon_future.result()))
+
+    results = []
+    for entry, (locales, error) in zip(entries, github_results):
+        pontoon, pontoon_error = pontoon_results[entry["pontoon"]]
+        error = pontoon_error or error
+        missing, ignored = ([], []) if error else compare_locales(pontoon, locales)
+        results.append(
+            {**entry, "missing": missing, "ignored": ignored, "error": error}
+        )
+
+    return results
 
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "--pontoon",
-        required=True,
+        required=False,
         dest="pontoon_project",
         help="Pontoon project name",
     )
     parser.add_argument(
         "--repo",
-        required=True,
+        required=False,
         dest="github_repo",
         help="GitHub repository name",
     )
+    parser.add_argument(
+        "--manifest",
+        required=False,
+        help="Path to CSV or JSON file with projects to check (batch mode)",
+    )
     parser.add_argument(
         "--owner",
         required=False,
@@ -96,39 +205,100 @@ def main():
         action="store_true",
         default=False,
         dest="csv_output",
-        help="Store data as output.csv",
+        help="Store data as output.csv (same as --output output.csv)",
     )
+    parser.add_argument(
+        "--concurrency",
+        required=False,
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help="Maximum number of requests sent at the same time to each API",
+    )
+    add_output_arguments(parser, default=None)
+    add_cache_arguments(parser)
 
     args = parser.parse_args()
+    if args.manifest:
+        entries = read_manifest(args.manifest, args.github_owner, args.github_path)
+    elif args.pontoon_project and args.github_repo:
+        entries = [
+            {
+                "pontoon": args.pontoon_project,
+                "repo": args.github_repo,
+                "owner": args.github_owner,
+                "path": args.github_path,
+            }
+        ]
+    else:
+        sys.exit("Either --manifest, or --pontoon and --repo are required.")
+    if not args.output and (args.csv_output or args.manifest):
+        args.output = "output.csv"
+    # Keep the standard output for the report if requested
+    log = sys.stderr if args.output == "-" else sys.stdout
 
-    pontoon_locales = retrieve_pontoon_locales(args.pontoon_project)
-    github_locales = retrieve_github_locales(
-        args.github_owner, args.github_repo, args.github_path
+    # Both clients share connections and the response cache
+    session = create_session(pool_size=max(10, args.concurrency))
+    pontoon_client = create_client(args, session=session, concurrency=args.concurrency)
+    github_client = GitHubClient(
+        token=os.environ.get("GITHUB_TOKEN"),
+        session=session,
+        concurrency=args.concurrency,
+        cache=pontoon_client.cache,
+        offline=args.offline,
+        refresh=args.refresh,
     )
+    with session, pontoon_client, github_client:
+        results = check_entries(pontoon_client, github_client, entries)
 
-    output = ["Missing Locales"]
-    missing_locales = list(set(github_locales) - set(pontoon_locales))
-    missing_locales.sort()
+    if not args.manifest:
+        result = results[0]
+        if result["error"]:
+            sys.exit(result["error"])
+        if result["ignored"]:
+            print(f"Ignored locales: {', '.join(result['ignored'])}", file=log)
+        if result["missing"]:
+            print(
+                f"Missing locales in Pontoon: {', '.join(result['missing'])}", file=log
+            )
+            if args.output:
+                with open_report(args, ["Missing Locales"]) as report:
+                    for locale in result["missing"]:
+                        report.write([locale])
+        else:
+            print("No missing locales found.", file=log)
+        return
 
-    # Clean up possible false positives
-    locales_without_region = [loc.split("-")[0] for loc in pontoon_locales]
-    ignored_locales = []
-    for locale in missing_locales[:]:
-        if locale in ["en-US", "en"] + locales_without_region:
-            missing_locales.remove(locale)
-            ignored_locales.append(locale)
-    if ignored_locales:
-        print(f"Ignored locales: {', '.join(ignored_locales)}")
-
-    if missing_locales:
-        print(f"Missing locales in Pontoon: {', '.join(missing_locales)}")
-        if args.csv_output:
-            with open("output.csv", "w") as f:
-                output.extend(missing_locales)
-                f.write("\n".join(output))
-                print("Missing locales saved to output.csv")
-    else:
-        print("No missing locales found.")
+    fields = [
+        "Project",
+        "Repository",
+        "Path",
+        "Missing Locales",
+        "Ignored Locales",
+        "Error",
+    ]
+    with open_report(args, fields) as report:
+        for result in results:
+            repository = f"{result['owner']}/{result['repo']}"
+            if result["error"]:
+                status = result["error"]
+            elif result["missing"]:
+                status = f"missing {', '.join(result['missing'])}"
+            else:
+                status = "no missing locales"
+            print(f"{result['pontoon']} ({repository}): {status}", file=log)
+            report.write(
+                [
+                    result["pontoon"],
+                    repository,
+                    result["path"],
+                    " ".join(result["missing"]),
+                    " ".join(result["ignored"]),
+                    result["error"] or "",
+                ]
+            )
+    errors = sum(1 for result in results if result["error"])
+    if errors:
+        print(f"{errors} of {len(results)} projects couldn't be checked", file=log)
 
 
 if __name__ == "__main__":
@@ -1,46 +1,54 @@
 #!/usr/bin/env python3
 
+from pontoon_api import add_cache_arguments, create_client
+from report_output import add_output_arguments, open_report
+from snapshot import load_snapshot
+import argparse
 import requests
 import sys
 
 
 def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--snapshot",
+        required=False,
+        help="Path to snapshot file (see snapshot.py) to read instead of the API",
+    )
+    add_cache_arguments(parser)
+    add_output_arguments(parser)
+    args = parser.parse_args()
+
     # Get completion stats for locales from Pontoon
 
-    pending_suggestions = {}
+    client = None
+    if args.snapshot:
+        locales = load_snapshot(args.snapshot).locales
+    else:
+        client = create_client(args)
+        locales = client.paginate(
+            "locales/",
+            description="pending suggestions",
+            fields="code,unreviewed_strings",
+        )
     try:
-        # Get the number of pending suggestions for each locale
-        url = "https://pontoon.mozilla.org/api/v2/locales/?fields=code,unreviewed_strings"
-        page = 1
-        while url:
-            print(f"Reading pending suggestions (page {page})")
-            response = requests.get(url)
-            response.raise_for_status()
-            data = response.json()
-
-            for locale_data in data.get("results", []):
-                locale = locale_data["code"]
-                if locale not in pending_suggestions:
-                    pending_suggestions[locale] = 0
-                pending_suggestions[locale] += locale_data["unreviewed_strings"]
-            # Get the next page URL
-            url = data.get("next")
-            page += 1
+        # Get the number of pending suggestions for each locale, sorted by
+        # locale (the same rows in all formats)
+        pending_suggestions = {}
+        for locale_data in locales:
+            locale = locale_data["code"]
+            if locale not in pending_suggestions:
+                pending_suggestions[locale] = 0
+            pending_suggestions[locale] += locale_data["unreviewed_strings"]
+        with open_report(args, ["Locale", "Pending Suggestions"], [str, int]) as report:
+            for row in sorted(pending_suggestions.items()):
+                report.write(row)
     except requests.RequestException as e:
         print(f"Error fetching data: {e}")
         sys.exit()
-
-    pending_suggestions = dict(sorted(pending_suggestions.items()))
-    output = []
-    output.append("Locale,Pending Suggestions")
-    # Only print requested locales
-    for locale, suggestions in pending_suggestions.items():
-        output.append("{},{}".format(locale, suggestions))
-
-    # Save locally
-    with open("output.csv", "w") as f:
-        f.write("\n".join(output))
-        print("Data stored as output.csv")
+    finally:
+        if client is not None:
+            client.close()
 
 
 if __name__ == "__main__":
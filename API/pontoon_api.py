@@ -0,0 +1,330 @@
+"""
+Shared client for Pontoon's REST API (v2), used by the scripts in this folder.
+
+Requests go through a single session, so connections are kept alive and
+reused across pages and endpoints instead of opening a new TLS connection for
+each request, and responses are gzip compressed. Transient errors (connection
+errors, 429 and 5xx responses) are retried with exponential backoff, honoring
+the `Retry-After` header sent with 429 and 503 responses.
+
+The session, response cache and limit of concurrent requests are handled by
+APIClient, also used by GitHubClient (github_api.py); PontoonClient adds
+pagination.
+
+Paginated endpoints are read with paginate(), following the `next` URL of each
+page: the next page is requested in the background while the current one is
+processed. Independent endpoints (e.g. multiple projects) can be read at the
+same time with map(). The number of requests sent at the same time is limited
+by `concurrency`. Clients are closed with close(), or used as context
+managers, to stop the threads fetching pages.
+
+With a ResponseCache (response_cache.py), responses are stored on disk and
+reused for `ttl` seconds, then revalidated with conditional requests. The cache
+is enabled by default with a TTL of one hour: reports can show data up to an
+hour old, unless `--refresh` or a lower `--cache-ttl` is used. Scripts expose
+it with add_cache_arguments() and create_client():
+- `--refresh` revalidates all cached responses, ignoring their age;
+- `--offline` only uses cached responses, without sending any request;
+- `--no-cache` disables the cache.
+
+Usage:
+    from pontoon_api import PontoonClient
+
+    with PontoonClient() as client:
+        for locale in client.paginate("locales/", fields="code,unreviewed_strings"):
+            print(locale["code"])
+        project = client.get("projects/firefox/", fields="locales")
+        projects = client.map(read_project, ["firefox", "firefox-for-android"])
+
+    parser = argparse.ArgumentParser()
+    add_cache_arguments(parser)
+    with create_client(parser.parse_args()) as client:
+        ...
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from response_cache import DEFAULT_TTL, ResponseCache
+from urllib.parse import urljoin
+from urllib3.util.retry import Retry
+import requests
+import sys
+import threading
+
+API_URL = "https://pontoon.mozilla.org/api/v2/"
+
+# Maximum number of requests sent at the same time
+DEFAULT_CONCURRENCY = 4
+
+# Status codes retried with backoff
+RETRY_STATUS = [429, 500, 502, 503, 504]
+
+
+def create_adapter(
+    retries=5,
+    backoff_factor=1,
+    pool_size=10,
+    retry_status=RETRY_STATUS,
+    retry_after=True,
+):
+    """
+    Return an HTTPAdapter with a pool of `pool_size` connections, retrying
+    failed GET requests and responses with a status in `retry_status` up to
+    `retries` times, waiting backoff_factor * 2^n seconds between attempts
+    (or the time requested by `Retry-After` if `retry_after` is set).
+    """
+
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=retry_status,
+        allowed_methods=["GET", "HEAD"],
+        respect_retry_after_header=retry_after,
+        # Return the last response instead, raise_for_status() reports it
+        raise_on_status=False,
+    )
+
+    return HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+    )
+
+
+def create_session(retries=5, backoff_factor=1, pool_size=10):
+    """
+    Return a requests Session with pooled connections, retrying failed GET
+    requests (see create_adapter()).
+    """
+
+    adapter = create_adapter(retries, backoff_factor, pool_size)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(
+        {
+            "Accept": "application/json",
+            "Accept-Encoding": "gzip",
+            "User-Agent": "pontoon-scripts (https://github.com/mozilla-l10n/pontoon-scripts)",
+        }
+    )
+
+    return session
+
+
+class NotCachedError(requests.RequestException):
+    """Raised in offline mode when a response is not cached."""
+
+
+class APIClient:
+    """
+    Base of API clients: shared session, response cache and limit of
+    concurrent requests. Subclasses can override request().
+    """
+
+    def __init__(
+        self,
+        base_url,
+        session=None,
+        timeout=60,
+        concurrency=DEFAULT_CONCURRENCY,
+        cache=None,
+        offline=False,
+        refresh=False,
+    ):
+        self.base_url = base_url
+        self.cache = cache
+        self.offline = offline
+        self.refresh = refresh
+        # Sessions passed by the caller can be shared, they're not closed
+        self.owns_session = session is None
+        self.session = session or create_session(pool_size=max(10, concurrency))
+        self.timeout = timeout
+        self.concurrency = concurrency
+        # Limit the number of requests in flight, whatever the number of
+        # threads waiting on them
+        self.slots = threading.BoundedSemaphore(concurrency)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Close the session, if it was created by the client."""
+
+        if self.owns_session:
+            self.session.close()
+
+    def url(self, path):
+        """Return the full URL of an endpoint, `path` can also be a full URL."""
+
+        return urljoin(self.base_url, path)
+
+    def get(self, path, **params):
+        """
+        Return the JSON data of an endpoint, with `params` as query string.
+
+        Raises requests.RequestException if the request still fails after
+        retries, or NotCachedError in offline mode.
+        """
+
+        url = self.url(path)
+        if params:
+            url = requests.Request("GET", url, params=params).prepare().url
+        if self.cache is None:
+            return self.request(url).json()
+
+        entry = self.cache.get(url)
+        if entry and (
+            self.offline or (not self.refresh and entry.is_fresh(self.cache.ttl))
+        ):
+            return entry.json()
+        if self.offline:
+            raise NotCachedError(f"{url} is not cached, run without --offline.")
+
+        headers = {}
+        if entry and entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry and entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        response = self.request(url, headers)
+        if response.status_code == 304 and entry:
+            self.cache.touch(url)
+            return entry.json()
+        self.cache.store(url, response)
+
+        return response.json()
+
+    def request(self, url, headers=None):
+        with self.slots:
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+        response.raise_for_status()
+
+        return response
+
+    def map(self, function, items):
+        """
+        Return [function(item) for item in items], calling `function` for up
+        to `concurrency` items at the same time (e.g. to read multiple
+        projects).
+
+        The first exception raised by `function` is raised again.
+        """
+
+        items = list(items)
+        if not items:
+            return []
+        # These threads only wait on requests (limited by `slots`) or on
+        # pages fetched by the prefetcher of PontoonClient
+        with ThreadPoolExecutor(
+            max_workers=min(len(items), self.concurrency)
+        ) as executor:
+            return list(executor.map(function, items))
+
+
+class PontoonClient(APIClient):
+    def __init__(self, base_url=API_URL, **kwargs):
+        super().__init__(base_url, **kwargs)
+        # Only used to fetch pages, its tasks never wait on other tasks
+        self.prefetcher = ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix="pontoon-api"
+        )
+
+    def close(self):
+        """Stop fetching pages in the background, and close the session."""
+
+        self.prefetcher.shutdown(cancel_futures=True)
+        super().close()
+
+    def fetch_page(self, url, params, description, page):
+        if description:
+            # Progress goes to stderr, the standard output can be a report
+            print(f"Reading {description} (page {page})", file=sys.stderr)
+
+        return self.get(url, **params)
+
+    def iter_pages(self, path, description=None, **params):
+        """
+        Yield the JSON data of each page of an endpoint.
+
+        The next page is requested in the background as soon as a page is
+        received, while the caller processes it. If `description` is set,
+        "Reading {description} (page N)" is printed to stderr before reading
+        each page.
+        """
+
+        page = 1
+        future = self.prefetcher.submit(
+            self.fetch_page, self.url(path), params, description, page
+        )
+        while future:
+            data = future.result()
+            # The next URL already includes the query string
+            url = data.get("next")
+            page += 1
+            future = (
+                self.prefetcher.submit(self.fetch_page, url, {}, description, page)
+                if url
+                else None
+            )
+            yield data
+
+    def paginate(self, path, key="results", description=None, **params):
+        """Yield the items stored in `key` of each page of an endpoint."""
+
+        for data in self.iter_pages(path, description, **params):
+            yield from data.get(key) or []
+
+
+def add_cache_arguments(parser):
+    """Add the options of the response cache to an ArgumentParser."""
+
+    parser.add_argument(
+        "--offline",
+        required=False,
+        action="store_true",
+        default=False,
+        help="Only use cached API responses, without sending requests",
+    )
+    parser.add_argument(
+        "--refresh",
+        required=False,
+        action="store_true",
+        default=False,
+        help="Revalidate all cached API responses, ignoring their age (use it for "
+        "up-to-date data)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        required=False,
+        action="store_false",
+        default=True,
+        dest="cache",
+        help="Don't store or use cached API responses",
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        required=False,
+        type=int,
+        default=DEFAULT_TTL,
+        help="Number of seconds cached API responses are used without revalidation "
+        f"(default: {DEFAULT_TTL}, reports can show data that old)",
+    )
+    parser.add_argument(
+        "--cache-path",
+        required=False,
+        default=None,
+        help="Path to the cache database (default: ~/.cache/pontoon-scripts/api_cache.sqlite)",
+    )
+
+
+def create_client(args, **kwargs):
+    """Return a PontoonClient set up with the options of add_cache_arguments()."""
+
+    if args.offline and not args.cache:
+        sys.exit("--offline requires the cache, remove --no-cache.")
+    cache = ResponseCache(args.cache_path, args.cache_ttl) if args.cache else None
+
+    return PontoonClient(
+        cache=cache, offline=args.offline, refresh=args.refresh, **kwargs
+    )
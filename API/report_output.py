@@ -0,0 +1,200 @@
+"""
+Shared output of the API reports: rows are written one by one to a CSV,
+NDJSON (one JSON object per line) or Parquet file, or to the standard output,
+instead of being formatted and joined in memory.
+
+The format is set with --format, or guessed from the extension of --output
+(CSV by default). Parquet requires pyarrow; rows are written in row groups of
+BATCH_SIZE rows, with a schema built from the declared type of each column
+(str by default), so that the file has all columns even without any row.
+
+Files are written to a temporary file first, which replaces the output once
+the report is complete: if the report fails, the previous output is kept.
+
+Usage:
+    from report_output import add_output_arguments, open_report
+
+    parser = argparse.ArgumentParser()
+    add_output_arguments(parser)
+    args = parser.parse_args()
+    with open_report(args, ["Locale", "Pending Suggestions"], [str, int]) as report:
+        report.write(["fr", 10])
+"""
+
+from contextlib import contextmanager
+import csv
+import json
+import os
+import sys
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+FORMATS = ["csv", "ndjson", "parquet"]
+EXTENSIONS = {
+    ".csv": "csv",
+    ".ndjson": "ndjson",
+    ".jsonl": "ndjson",
+    ".parquet": "parquet",
+}
+
+# Number of rows in each Parquet row group
+BATCH_SIZE = 10000
+
+# Parquet types of column types
+PARQUET_TYPES = {
+    str: "string",
+    int: "int64",
+    float: "float64",
+    bool: "bool",
+}
+
+
+def add_output_arguments(parser, default="output.csv"):
+    """Add --output and --format options to an ArgumentParser."""
+
+    parser.add_argument(
+        "--output",
+        required=False,
+        default=default,
+        help=f"Path to output file, or - for standard output (default: {default})",
+    )
+    parser.add_argument(
+        "--format",
+        required=False,
+        choices=FORMATS,
+        default=None,
+        dest="output_format",
+        help="Output format (default: from the extension of --output, or csv)",
+    )
+
+
+def guess_format(fp):
+    for extension, output_format in EXTENSIONS.items():
+        if fp.lower().endswith(extension):
+            return output_format
+
+    return "csv"
+
+
+def report_format(args):
+    """Return the format of the output set with add_output_arguments()."""
+
+    return args.output_format or guess_format(args.output)
+
+
+class CSVWriter:
+    def __init__(self, f, fields, types):
+        self.writer = csv.writer(f, lineterminator="\n")
+        self.writer.writerow(fields)
+
+    def write(self, row):
+        self.writer.writerow(row)
+
+    def close(self, complete=True):
+        pass
+
+
+class NDJSONWriter:
+    def __init__(self, f, fields, types):
+        self.f = f
+        self.fields = fields
+
+    def write(self, row):
+        self.f.write(json.dumps(dict(zip(self.fields, row)), ensure_ascii=False))
+        self.f.write("\n")
+
+    def close(self, complete=True):
+        pass
+
+
+class ParquetWriter:
+    def __init__(self, fp, fields, types):
+        self.schema = pyarrow.schema(
+            [
+                (field, pyarrow.type_for_alias(PARQUET_TYPES[column_type]))
+                for field, column_type in zip(fields, types)
+            ]
+        )
+        self.writer = pyarrow.parquet.ParquetWriter(fp, self.schema)
+        self.rows = []
+
+    def write(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        columns = zip(*self.rows)
+        table = pyarrow.Table.from_arrays(
+            [
+                pyarrow.array(column, type=field.type)
+                for column, field in zip(columns, self.schema)
+            ],
+            schema=self.schema,
+        )
+        self.writer.write_table(table)
+        self.rows = []
+
+    def close(self, complete=True):
+        # Rows of an incomplete report are dropped, the file is only closed
+        if complete and self.rows:
+            self.flush()
+        self.writer.close()
+
+
+@contextmanager
+def open_report(args, fields, types=None):
+    """
+    Return a writer for the output set with add_output_arguments(), with a
+    header of `fields`. Rows are written with write(row), in the order of
+    `fields`.
+
+    `types` lists the type of each column (str, int, float or bool, str by
+    default), used for the schema of Parquet files. Values can also be None.
+    """
+
+    output_format = report_format(args)
+    types = types or [str] * len(fields)
+    to_stdout = args.output == "-"
+    # Written to a temporary file first, not to leave a partial report
+    temp_fp = None if to_stdout else f"{args.output}.tmp"
+    if output_format == "parquet":
+        if pyarrow is None:
+            sys.exit(
+                "Parquet output requires pyarrow, install it with: pip install pyarrow"
+            )
+        if to_stdout:
+            sys.exit("Parquet output can't be written to the standard output.")
+        f = None
+        writer = ParquetWriter(temp_fp, fields, types)
+    else:
+        f = (
+            sys.stdout
+            if to_stdout
+            else open(temp_fp, "w", newline="", encoding="utf-8")
+        )
+        writer_class = CSVWriter if output_format == "csv" else NDJSONWriter
+        writer = writer_class(f, fields, types)
+
+    complete = False
+    try:
+        yield writer
+        writer.close()
+        complete = True
+    finally:
+        if not complete:
+            writer.close(complete=False)
+        if f is not None and not to_stdout:
+            f.close()
+        if temp_fp is not None:
+            if complete:
+                os.replace(temp_fp, args.output)
+            else:
+                os.remove(temp_fp)
+
+    if not to_stdout:
+        print(f"Data stored as {args.output}")
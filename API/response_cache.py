@@ -0,0 +1,110 @@
+"""
+On-disk cache of Pontoon API responses, used by PontoonClient (pontoon_api.py).
+
+Responses are stored in a SQLite database, keyed by full URL (including the
+query string), with their ETag and Last-Modified headers. A cached response
+younger than `ttl` seconds is used without sending any request; an older one is
+revalidated with a conditional request (If-None-Match, If-Modified-Since), so
+an unchanged response is not downloaded again.
+
+The database is stored in ~/.cache/pontoon-scripts/ by default (or in
+$XDG_CACHE_HOME/pontoon-scripts/).
+
+Usage:
+    from response_cache import ResponseCache
+
+    cache = ResponseCache(ttl=3600)
+    entry = cache.get(url)
+    if entry and entry.is_fresh(cache.ttl):
+        data = entry.json()
+"""
+
+from collections import namedtuple
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Responses are used without revalidation for an hour by default
+DEFAULT_TTL = 3600
+
+
+def default_cache_path():
+    cache_root = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+
+    return os.path.join(cache_root, "pontoon-scripts", "api_cache.sqlite")
+
+
+class CacheEntry(
+    namedtuple("CacheEntry", ["body", "etag", "last_modified", "fetched"])
+):
+    __slots__ = ()
+
+    def is_fresh(self, ttl):
+        return time.time() - self.fetched < ttl
+
+    def json(self):
+        return json.loads(self.body)
+
+
+class ResponseCache:
+    def __init__(self, fp=None, ttl=DEFAULT_TTL):
+        self.fp = fp or default_cache_path()
+        self.ttl = ttl
+        if self.fp != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.fp)), exist_ok=True)
+        # The connection is shared by the threads of PontoonClient, queries
+        # are serialized with a lock
+        self.connection = sqlite3.connect(self.fp, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    url TEXT PRIMARY KEY,
+                    body TEXT NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    fetched REAL NOT NULL
+                )
+                """)
+
+    def get(self, url):
+        """Return the CacheEntry of a URL, or None if it's not cached."""
+
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT body, etag, last_modified, fetched FROM responses WHERE url = ?",
+                (url,),
+            ).fetchone()
+
+        return CacheEntry(*row) if row else None
+
+    def store(self, url, response):
+        """Store the body and validators of a requests Response."""
+
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (
+                    url,
+                    response.text,
+                    response.headers.get("ETag"),
+                    response.headers.get("Last-Modified"),
+                    time.time(),
+                ),
+            )
+
+    def touch(self, url):
+        """Mark a cached response as fresh, after a 304 Not Modified response."""
+
+        with self.lock, self.connection:
+            self.connection.execute(
+                "UPDATE responses SET fetched = ? WHERE url = ?", (time.time(), url)
+            )
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+
+"""
+Download a snapshot of Pontoon's locale and project statistics, used by the
+reports instead of querying the API (see their --snapshot option).
+
+Locales are read once with the union of the fields needed by the reports
+(LOCALE_FIELDS), and localizations are read for each project (DEFAULT_PROJECTS
+unless --project is set). The snapshot is stored as JSON Lines, one record per
+line, optionally gzip compressed (.gz extension):
+- {"type": "snapshot", "created": ..., "projects": [...]}: first line
+- {"type": "locale", "code": ..., "projects": [...], "missing_strings": ...}
+- {"type": "localization", "project": ..., "locale": ..., "missing_strings": ...}
+
+Each snapshot is also appended to the history (see history.py), unless
+--no-history is set. Snapshots of the history are dated with the time of the
+download: cached API responses are always revalidated for them (as with
+--refresh), and --offline requires --no-history.
+
+Usage:
+    python snapshot.py
+    python snapshot.py --output snapshot.jsonl.gz --project firefox --project firefox-for-android
+    python history.py diff
+    python pending_suggestions.py --snapshot snapshot.jsonl
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from itertools import chain
+from history import HistoryStore
+from pontoon_api import DEFAULT_CONCURRENCY, add_cache_arguments, create_client
+import argparse
+import gzip
+import json
+import os
+import requests
+import sys
+
+# Fields of /api/v2/locales/ used by the reports
+LOCALE_FIELDS = ["code", "projects", "missing_strings", "unreviewed_strings"]
+
+# Projects of the health report (stats/health_report/extract_completion_data.py)
+DEFAULT_PROJECTS = [
+    "firefox-for-android",
+    "firefox-for-ios",
+    "firefox-relay-website",
+    "firefox",
+    "mozilla-accounts",
+    "mozilla-monitor-website",
+    "mozilla-vpn-client",
+]
+
+
+def open_snapshot_file(fp, mode, compressed):
+    if compressed:
+        return gzip.open(fp, mode + "t", encoding="utf-8")
+
+    return open(fp, mode, encoding="utf-8")
+
+
+def normalize_localization(project, localization):
+    """Return a localization of /api/v2/projects/<slug>/ as a flat record."""
+
+    record = {"type": "localization", "project": project}
+    for key, value in localization.items():
+        record[key] = value["code"] if key == "locale" else value
+
+    return record
+
+
+def read_localizations(client, project):
+    return [
+        normalize_localization(project, localization)
+        for localization in client.paginate(
+            f"projects/{project}/",
+            key="localizations",
+            description=f"data for {project}",
+            fields="localizations",
+        )
+    ]
+
+
+def download_snapshot(client, fp, projects):
+    """
+    Write a snapshot of locales and localizations of `projects` to `fp`.
+    Return (creation time, locales, localizations).
+    """
+
+    # Projects are read in the background while locales are read
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        projects_future = executor.submit(
+            client.map, lambda project: read_localizations(client, project), projects
+        )
+        locales = [
+            {"type": "locale", **locale}
+            for locale in client.paginate(
+                "locales/", description="locales", fields=",".join(LOCALE_FIELDS)
+            )
+        ]
+        localizations = list(chain.from_iterable(projects_future.result()))
+
+    # Write to a temporary file first, not to leave a partial snapshot
+    temp_fp = f"{fp}.tmp"
+    with open_snapshot_file(temp_fp, "w", fp.endswith(".gz")) as f:
+        header = {
+            "type": "snapshot",
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "api": client.base_url,
+            "projects": projects,
+        }
+        for record in chain([header], locales, localizations):
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    os.replace(temp_fp, fp)
+
+    return header["created"], locales, localizations
+
+
+class Snapshot:
+    def __init__(self, fp):
+        self.created = None
+        self.projects = []
+        self.locales = []
+        self.localizations = {}
+        with open_snapshot_file(fp, "r", fp.endswith(".gz")) as f:
+            for line in f:
+                record = json.loads(line)
+                record_type = record.pop("type")
+                if record_type == "snapshot":
+                    self.created = record["created"]
+                    self.projects = record["projects"]
+                elif record_type == "locale":
+                    self.locales.append(record)
+                elif record_type == "localization":
+                    self.localizations.setdefault(record["project"], []).append(record)
+
+    def project_localizations(self, project):
+        """Return the localization records of a project."""
+
+        if project not in self.projects:
+            sys.exit(
+                f"Project {project} is not in the snapshot, "
+                f"download it with: snapshot.py --project {project}"
+            )
+
+        return self.localizations.get(project, [])
+
+
+def load_snapshot(fp):
+    try:
+        snapshot = Snapshot(fp)
+    except FileNotFoundError:
+        sys.exit(f"File {fp} doesn't exist.")
+    print(f"Reading snapshot {fp} (created {snapshot.created})", file=sys.stderr)
+
+    return snapshot
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--output",
+        required=False,
+        default="snapshot.jsonl",
+        help="Path to snapshot file (JSON Lines, gzip compressed with .gz extension)",
+    )
+    parser.add_argument(
+        "--project",
+        required=False,
+        action="append",
+        dest="projects",
+        help="Project to include (can be repeated, default: health report projects)",
+    )
+    parser.add_argument(
+        "--concurrency",
+        required=False,
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help="Maximum number of requests sent at the same time",
+    )
+    parser.add_argument(
+        "--history",
+        required=False,
+        default=None,
+        help="Path to the history database (see history.py)",
+    )
+    parser.add_argument(
+        "--no-history",
+        required=False,
+        action="store_false",
+        default=True,
+        dest="store_history",
+        help="Don't append the snapshot to the history",
+    )
+    add_cache_arguments(parser)
+    args = parser.parse_args()
+    if args.store_history:
+        # Cached responses can be older than the date of the snapshot
+        if args.offline:
+            sys.exit(
+                "--offline can't be used for snapshots of the history, "
+                "add --no-history."
+            )
+        args.refresh = True
+
+    try:
+        with create_client(args, concurrency=args.concurrency) as client:
+            created, locales, localizations = download_snapshot(
+                client, args.output, args.projects or DEFAULT_PROJECTS
+            )
+    except requests.RequestException as e:
+        print(f"Error fetching data: {e}")
+        sys.exit()
+    print(f"Snapshot stored as {args.output}")
+
+    if args.store_history:
+        store = HistoryStore(args.history)
+        snapshot_id = store.append(
+            created, locales, localizations, os.path.basename(args.output)
+        )
+        store.close()
+        print(f"Snapshot appended to history as {snapshot_id} ({store.fp})")
+
+
+if __name__ == "__main__":
+    main()
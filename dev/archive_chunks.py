@@ -0,0 +1,174 @@
+"""
+Reading log archives in chunks that can be read again later without
+decompressing the archive from the start.
+
+A chunk is described by an ArchiveSpan: the compressed offset of the gzip
+member including the start of the chunk, the number of uncompressed bytes to
+skip in that member, and the uncompressed length of the chunk. Archives built
+by concatenating gzip members (e.g. hourly) can be read from the member
+including the chunk. For single-member archives, the start of the file is
+decompressed without splitting or parsing lines, which is much faster than
+reading the whole archive line by line. Plain files are read from the offset.
+
+Archives can also be compressed with bzip2 (.bz2), xz (.xz) or zstd (.zst,
+requires `pip install zstandard`): open_archive() detects the codec from the
+extension. These are streams without gzip members, so their chunks are read
+by decompressing the start of the archive.
+
+Usage:
+    from archive_chunks import iter_log_chunks, iter_span_lines
+
+    spans = [span for span, lines in iter_log_chunks(archive_file)]
+    for line in iter_span_lines(spans[-1]):
+        ...
+"""
+
+from bisect import bisect_right
+from collections import namedtuple
+import bz2
+import gzip
+import lzma
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+BLOCK_SIZE = 1024 * 1024
+CHUNK_SIZE = 4 * 1024 * 1024
+
+# Compressed streams without members that can be read from an offset
+STREAM_EXTENSIONS = (".bz2", ".xz", ".zst")
+
+ArchiveSpan = namedtuple("ArchiveSpan", ["path", "member_offset", "skip", "length"])
+
+
+def open_archive(fp):
+    """Return a binary file object with the uncompressed content of an archive."""
+
+    if fp.endswith(".gz"):
+        return gzip.open(fp, "rb")
+    if fp.endswith(".bz2"):
+        return bz2.open(fp, "rb")
+    if fp.endswith(".xz"):
+        return lzma.open(fp, "rb")
+    if fp.endswith(".zst"):
+        if zstandard is None:
+            raise ImportError(
+                f"Reading {fp} requires the zstandard package (pip install zstandard)."
+            )
+        return zstandard.ZstdDecompressor().stream_reader(open(fp, "rb"), closefd=True)
+
+    return open(fp, "rb")
+
+
+def iter_blocks(fp, members):
+    """
+    Yield blocks of uncompressed data from a file.
+
+    The start of each gzip member is added to `members` as (uncompressed
+    offset, compressed offset) while reading.
+    """
+
+    members.append((0, 0))
+    if not fp.endswith(".gz"):
+        with open_archive(fp) as f:
+            while block := f.read(BLOCK_SIZE):
+                yield block
+        return
+
+    with open(fp, "rb") as f:
+        decompressor = zlib.decompressobj(wbits=31)
+        compressed_offset = 0
+        uncompressed_offset = 0
+        while data := f.read(BLOCK_SIZE):
+            while data:
+                block = decompressor.decompress(data)
+                uncompressed_offset += len(block)
+                yield block
+                if not decompressor.eof:
+                    compressed_offset += len(data)
+                    break
+                # Start of the next member
+                unused_data = decompressor.unused_data
+                compressed_offset += len(data) - len(unused_data)
+                members.append((uncompressed_offset, compressed_offset))
+                decompressor = zlib.decompressobj(wbits=31)
+                data = unused_data
+
+
+def iter_lines(f, length=-1):
+    """
+    Yield lines (without line break) of a binary file object, read in large
+    blocks. A non-negative `length` stops reading after that number of bytes.
+    """
+
+    remaining = length
+    pending = b""
+    while remaining:
+        block = f.read(BLOCK_SIZE if remaining < 0 else min(BLOCK_SIZE, remaining))
+        if not block:
+            break
+        if remaining > 0:
+            remaining -= len(block)
+        lines = (pending + block).split(b"\n")
+        pending = lines.pop()
+        yield from lines
+    if pending:
+        yield pending
+
+
+def iter_log_chunks(fp, chunk_size=CHUNK_SIZE):
+    """
+    Yield (span, lines) for consecutive chunks of about `chunk_size`
+    uncompressed bytes, where lines don't include the line break.
+    """
+
+    members = []
+
+    def get_span(start, end):
+        member_start, member_offset = members[
+            bisect_right(members, (start, float("inf"))) - 1
+        ]
+        return ArchiveSpan(fp, member_offset, start - member_start, end - start)
+
+    pending = b""
+    position = 0
+    chunk_start = 0
+    chunk_lines = []
+    for block in iter_blocks(fp, members):
+        lines = (pending + block).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            chunk_lines.append(line)
+            position += len(line) + 1
+            if position - chunk_start >= chunk_size:
+                yield get_span(chunk_start, position), chunk_lines
+                chunk_start = position
+                chunk_lines = []
+
+    if pending:
+        chunk_lines.append(pending)
+        position += len(pending)
+    if chunk_lines:
+        yield get_span(chunk_start, position), chunk_lines
+
+
+def iter_span_lines(span):
+    """Yield lines of a span, a negative length reads until the end of file."""
+
+    with open(span.path, "rb") as raw:
+        if span.path.endswith(".gz"):
+            raw.seek(span.member_offset)
+            f = gzip.GzipFile(fileobj=raw)
+            f.seek(span.skip)
+        elif span.path.endswith(STREAM_EXTENSIONS):
+            f = open_archive(span.path)
+            f.seek(span.skip)
+        else:
+            f = raw
+            f.seek(span.member_offset + span.skip)
+
+        with f:
+            yield from iter_lines(f, span.length)
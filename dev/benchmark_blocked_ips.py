@@ -0,0 +1,91 @@
+"""
+This script can be used to compare the time needed to check IPs against the
+`BLOCKED_IPS` setting, using a loop over all ranges (original implementation)
+or the sorted intervals in blocked_ips.py.
+
+Ranges and IPs are generated randomly, no setting is needed.
+
+Usage:
+    python benchmark_blocked_ips.py
+    python benchmark_blocked_ips.py --ranges 500 --ips 1000000
+"""
+
+from blocked_ips import BlockedIPs
+from ipaddress import IPv4Address, ip_network
+import argparse
+import random
+import time
+
+
+def generate_setting(num_ranges):
+    ranges = []
+    for _ in range(num_ranges):
+        prefix = random.choice([16, 20, 24, 28, 32])
+        address = IPv4Address(random.getrandbits(32))
+        ranges.append(str(ip_network(f"{address}/{prefix}", strict=False)))
+
+    return ", ".join(ranges)
+
+
+def measure(label, function, num_ips):
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    print(f"{label}: {num_ips / elapsed:,.0f} IPs/s ({elapsed:.2f}s)")
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--ranges",
+        required=False,
+        type=int,
+        default=300,
+        help="Number of ranges in the generated setting",
+    )
+    parser.add_argument(
+        "--ips",
+        required=False,
+        type=int,
+        default=100000,
+        help="Number of IPs to check",
+    )
+    args = parser.parse_args()
+
+    random.seed(0)
+    blocked_ips = BlockedIPs(generate_setting(args.ranges))
+    networks = blocked_ips.networks
+    # Pick half of the IPs inside blocked ranges
+    ip_objs = [
+        (
+            random.choice(networks)[0]
+            if random.random() < 0.5
+            else IPv4Address(random.getrandbits(32))
+        )
+        for _ in range(args.ips)
+    ]
+
+    linear = measure(
+        "Loop over ranges",
+        lambda: [any(ip_obj in network for network in networks) for ip_obj in ip_objs],
+        args.ips,
+    )
+    search = measure(
+        "Binary search",
+        lambda: [blocked_ips.contains_address(ip_obj) for ip_obj in ip_objs],
+        args.ips,
+    )
+    bulk = measure(
+        "Bulk classification",
+        lambda: blocked_ips.classify(ip_objs),
+        args.ips,
+    )
+
+    if not linear == search == bulk:
+        print("Results don't match.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+This script can be used to measure how many lines per second can be parsed
+from Papertrail's archives in JSON format, comparing the original approach
+(decode each line and call json.loads) with the byte-level pre-filter and the
+faster JSON backend used by heroku_json_log.py.
+
+Lines are generated in memory, no log file is needed.
+
+Usage:
+    python benchmark_heroku_json_log.py
+    python benchmark_heroku_json_log.py --lines 1000000 --ips 10000
+"""
+
+from functools import partial
+from heroku_json_log import count_lines, extract_ip, extract_path_for_ip, loads
+import argparse
+import json
+import random
+import time
+
+
+def generate_lines(num_lines, num_ips):
+    ips = [f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}" for i in range(num_ips)]
+    paths = ["/", "/translate/", "/api/v2/locales/", "/de/firefox/all-resources/"]
+    lines = []
+    for _ in range(num_lines):
+        record = {
+            "message": "at=info method=GET",
+            "heroku": {
+                "fwd": random.choice(ips),
+                "path": random.choice(paths),
+                "status": 200,
+            },
+            "apache": {"userAgent": "Mozilla/5.0"},
+        }
+        lines.append(json.dumps(record).encode() + b"\n")
+
+    return lines, ips
+
+
+def count_lines_baseline(lines, ip):
+    # Original implementation: decode and parse every line with json
+    urls = {}
+    for line in lines:
+        json_line = json.loads(line.decode("utf-8", errors="ignore"))
+        if extract_ip(json_line) != ip:
+            continue
+        url = json_line.get("heroku", {}).get("path", "")
+        if url:
+            urls[url] = urls.get(url, 0) + 1
+
+    return urls
+
+
+def measure(label, function, num_lines):
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    print(f"{label}: {num_lines / elapsed:,.0f} lines/s ({elapsed:.2f}s)")
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--lines",
+        required=False,
+        type=int,
+        default=200000,
+        help="Number of lines to generate",
+    )
+    parser.add_argument(
+        "--ips",
+        required=False,
+        type=int,
+        default=1000,
+        help="Number of distinct IPs in generated lines",
+    )
+    args = parser.parse_args()
+
+    random.seed(0)
+    lines, ips = generate_lines(args.lines, args.ips)
+    ip = ips[0]
+    extractors = {"urls": partial(extract_path_for_ip, ip)}
+
+    print(f"JSON backend: {loads.__module__}")
+    baseline = measure(
+        "json.loads on every line",
+        partial(count_lines_baseline, lines, ip),
+        args.lines,
+    )
+    measure(
+        "Fast backend on every line",
+        partial(count_lines, lines, extractors),
+        args.lines,
+    )
+    filtered = measure(
+        "Fast backend with pre-filter",
+        partial(count_lines, lines, extractors, [ip.encode()]),
+        args.lines,
+    )
+
+    if baseline != dict(filtered["urls"]):
+        print("Results don't match.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+This script can be used to measure the throughput of the log scripts on
+synthetic logs (see generate_heroku_logs.py), and to check that a change
+doesn't modify their output.
+
+For each number of lines, logs are generated once (text router log and JSON
+archives), then each script is run as a separate process. It reports lines
+per second, peak memory (RSS of the largest process, including pool workers)
+and a digest of the output. Runs are offline, no real log is needed.
+
+Save results with `--save`, then compare a later run with `--baseline`: the
+speedup is displayed for each script, and scripts whose output changed are
+flagged.
+
+Usage:
+    python benchmark_heroku_logs.py
+    python benchmark_heroku_logs.py --lines 100000 --lines 1000000 --save before.csv
+    python benchmark_heroku_logs.py --lines 100000 --lines 1000000 --baseline before.csv
+"""
+
+from generate_heroku_logs import generate, generated_ip
+from hashlib import sha1
+import argparse
+import csv
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+RESULT_FIELDS = [
+    "script",
+    "lines",
+    "seconds",
+    "lines_per_second",
+    "peak_rss_mb",
+    "output",
+]
+
+
+def script_commands(data_path, processes=None):
+    """Return (script, arguments) for each benchmarked script."""
+
+    hot_ip = generated_ip(0)
+    archives = os.path.join(data_path, "json.gz")
+    processes = ["--processes", str(processes)] if processes else []
+
+    return [
+        (
+            "check_ips_heroku_log.py",
+            [os.path.join(data_path, "router.log")],
+        ),
+        (
+            "check_urls_ip_heroku_log.py",
+            [os.path.join(data_path, "json", "2024-05-01-00.json"), "--ip", hot_ip],
+        ),
+        (
+            "extract_ip_heroku_json_log.py",
+            [archives] + processes,
+        ),
+        (
+            "extract_useragent_heroku_json_log.py",
+            [archives] + processes,
+        ),
+        (
+            "extract_urls_ip_heroku_json_log.py",
+            [archives, "--ip", hot_ip] + processes,
+        ),
+        # Replaces the three extract_*_heroku_json_log.py scripts above, its
+        # peak memory is compared to theirs
+        (
+            "score_clients_heroku_json_log.py",
+            [archives] + processes,
+        ),
+    ]
+
+
+def generate_data(data_path, num_lines, num_ips, skew, num_files):
+    if os.path.exists(os.path.join(data_path, "router.log")):
+        return
+    print(f"Generating {num_lines:,} lines in {data_path}...")
+    generate(data_path, num_lines, num_ips, skew, ["text"])
+    # check_urls_ip_heroku_log.py reads a single JSON file
+    generate(data_path, num_lines, num_ips, skew, ["json"], num_files=1)
+    generate(data_path, num_lines, num_ips, skew, ["json.gz"], num_files=num_files)
+
+
+def run_script(script, arguments):
+    """Return (seconds, peak RSS in MB, output digest) of a script run."""
+
+    script_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), script)
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, script_path] + arguments, stdout=subprocess.PIPE
+    )
+    digest = sha1()
+    while block := process.stdout.read(65536):
+        digest.update(block)
+    process.stdout.close()
+    # wait4() returns the resource usage of this script only, including its
+    # terminated child processes
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode != 0:
+        sys.exit(f"{script} {' '.join(arguments)} failed.")
+
+    # ru_maxrss is in KB on Linux, bytes on macOS
+    peak_rss = usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+    return elapsed, peak_rss, digest.hexdigest()[:12]
+
+
+def read_results(fp):
+    try:
+        with open(fp, newline="") as f:
+            return {
+                (row["script"], int(row["lines"])): row for row in csv.DictReader(f)
+            }
+    except FileNotFoundError:
+        sys.exit(f"File {fp} doesn't exist.")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--lines",
+        required=False,
+        action="append",
+        type=int,
+        help="Number of lines to generate (can be repeated, default: 100000)",
+    )
+    parser.add_argument(
+        "--ips",
+        required=False,
+        type=int,
+        default=10000,
+        help="Number of distinct IPs",
+    )
+    parser.add_argument(
+        "--skew",
+        required=False,
+        type=float,
+        default=1.1,
+        help="Exponent of the Zipf distribution of IPs (0 for uniform)",
+    )
+    parser.add_argument(
+        "--files",
+        required=False,
+        type=int,
+        default=4,
+        help="Number of JSON archives",
+    )
+    parser.add_argument(
+        "--processes",
+        required=False,
+        type=int,
+        default=None,
+        help="Number of processes used by the extract_* scripts",
+    )
+    parser.add_argument(
+        "--repeat",
+        required=False,
+        type=int,
+        default=1,
+        help="Number of runs of each script, keeping the fastest",
+    )
+    parser.add_argument(
+        "--data",
+        required=False,
+        help="Path to folder keeping generated logs between runs (temporary folder if not set)",
+    )
+    parser.add_argument(
+        "--save",
+        required=False,
+        help="Path to CSV file to store results",
+    )
+    parser.add_argument(
+        "--baseline",
+        required=False,
+        help="Path to CSV file with results of a previous run to compare with",
+    )
+    args = parser.parse_args()
+
+    if not hasattr(os, "wait4"):
+        sys.exit("This script requires a POSIX system.")
+    baseline = read_results(args.baseline) if args.baseline else {}
+
+    with tempfile.TemporaryDirectory() as temp_path:
+        data_root = args.data or temp_path
+        results = []
+        for num_lines in args.lines or [100000]:
+            data_path = os.path.join(
+                data_root, f"{num_lines}-{args.ips}-{args.skew}-{args.files}"
+            )
+            generate_data(data_path, num_lines, args.ips, args.skew, args.files)
+
+            print(
+                f"\n{num_lines:,} lines\n"
+                f"{'Script':<38} {'Lines/s':>12} {'Seconds':>9} {'RSS (MB)':>9} "
+                f"{'Output':>12}"
+            )
+            for script, arguments in script_commands(data_path, args.processes):
+                runs = [run_script(script, arguments) for _ in range(args.repeat)]
+                seconds = min(run[0] for run in runs)
+                peak_rss = max(run[1] for run in runs)
+                output = runs[0][2]
+                results.append(
+                    {
+                        "script": script,
+                        "lines": num_lines,
+                        "seconds": f"{seconds:.3f}",
+                        "lines_per_second": f"{num_lines / seconds:.0f}",
+                        "peak_rss_mb": f"{peak_rss:.1f}",
+                        "output": output,
+                    }
+                )
+
+                comparison = ""
+                previous = baseline.get((script, num_lines))
+                if previous:
+                    comparison = f" x{float(previous['seconds']) / seconds:.2f}"
+                    if previous["output"] != output:
+                        comparison += " OUTPUT CHANGED"
+                print(
+                    f"{script:<38} {num_lines / seconds:>12,.0f} {seconds:>9.2f} "
+                    f"{peak_rss:>9.1f} {output:>12}{comparison}"
+                )
+
+    if args.save:
+        with open(args.save, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+            writer.writeheader()
+            writer.writerows(results)
+        print(f"\nResults stored as {args.save}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""
+Shared parsing of the `BLOCKED_IPS` setting of the mozilla-pontoon app.
+
+Populate `BLOCKED_IP_SETTING` with the IPs stored in the app settings.
+
+Open https://dashboard.heroku.com/apps/mozilla-pontoon/resources
+
+Click `Reveal Config Vars`, then search for `BLOCKED_IPS`, and copy & paste the
+value as is.
+
+IPs and ranges are converted once into sorted, non-overlapping intervals of
+integers for each IP version, so checking an IP is a binary search instead of
+a loop over all ranges.
+
+aggregate_networks() collapses IPs and ranges into fewer CIDR ranges, covering
+a limited number of addresses that were not listed, to keep the setting short.
+
+Usage:
+    from blocked_ips import BlockedIPs
+
+    blocked_ips = BlockedIPs()
+    if "192.168.0.1" in blocked_ips:
+        ...
+"""
+
+from bisect import bisect_right
+from ipaddress import IPv4Network, IPv6Network, ip_address, ip_network
+import heapq
+
+# Copy from Heroku settings
+BLOCKED_IP_SETTING = ""
+
+# Shortest prefix used when aggregating IPs into ranges, by IP version
+MIN_PREFIXLEN = {4: 16, 6: 48}
+
+
+def merge_intervals(intervals):
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+
+    return merged
+
+
+class BlockedIPs:
+    def __init__(self, setting=BLOCKED_IP_SETTING):
+        self.networks = []
+        for ip in setting.split(","):
+            ip = ip.strip()
+            if ip == "":
+                continue
+            try:
+                # Check if it's a valid IP range (CIDR notation), single IPs
+                # are stored as /32 or /128 ranges
+                self.networks.append(ip_network(ip, strict=False))
+            except ValueError:
+                print(f"Invalid IP or IP range defined in BLOCKED_IPS: {ip}")
+
+        self.starts = {4: [], 6: []}
+        self.ends = {4: [], 6: []}
+        for version in self.starts:
+            intervals = [
+                (int(network.network_address), int(network.broadcast_address))
+                for network in self.networks
+                if network.version == version
+            ]
+            for start, end in merge_intervals(intervals):
+                self.starts[version].append(start)
+                self.ends[version].append(end)
+
+    def __contains__(self, ip):
+        try:
+            ip_obj = ip_address(ip)
+        except ValueError:
+            return False
+
+        return self.contains_address(ip_obj)
+
+    def contains_address(self, ip_obj):
+        value = int(ip_obj)
+        index = bisect_right(self.starts[ip_obj.version], value) - 1
+
+        return index >= 0 and value <= self.ends[ip_obj.version][index]
+
+    def classify(self, ip_objs):
+        """
+        Return a list of booleans, True for each blocked IP in `ip_objs`.
+
+        Same as calling contains_address() for each IP, without the overhead
+        of a method call per IP when classifying millions of addresses.
+        """
+
+        starts = self.starts
+        ends = self.ends
+        blocked = []
+        append = blocked.append
+        for ip_obj in ip_objs:
+            value = int(ip_obj)
+            version = ip_obj.version
+            index = bisect_right(starts[version], value) - 1
+            append(index >= 0 and value <= ends[version][index])
+
+        return blocked
+
+
+def cidr_blocks(start, end, bits):
+    """Yield (start, prefix length) of the fewest CIDR blocks covering an interval."""
+
+    while start <= end:
+        # Largest block aligned on start and not going past end
+        size = (start & -start) if start else 1 << bits
+        while size > end - start + 1:
+            size >>= 1
+        yield start, bits - size.bit_length() + 1
+        start += size
+
+
+def aggregate_networks(networks, collateral=0, min_prefixlen=MIN_PREFIXLEN):
+    """
+    Return (networks, collateral used): the smallest list of networks covering
+    all addresses of `networks` found by greedy aggregation, covering at most
+    `collateral` addresses that are not in `networks`.
+
+    Networks are first collapsed into non-overlapping CIDR blocks (leaves),
+    sorted by address. The candidate supernets are the smallest ones covering
+    two adjacent leaves, i.e. len(leaves) - 1 nodes forming a binary tree.
+    Nodes are merged by lowest cost per block removed, where the cost is the
+    number of extra addresses covered, until the collateral limit is reached.
+    Supernets shorter than `min_prefixlen` (by IP version) are never used.
+
+    Addresses are handled as integers, ipaddress objects are only created for
+    the result.
+    """
+
+    result = []
+    used = 0
+    for version, bits in ((4, 32), (6, 128)):
+        intervals = []
+        for network in networks:
+            if network.version == version:
+                start = int(network.network_address)
+                end = start + (1 << (bits - network.prefixlen)) - 1
+                intervals.append((start, end))
+        leaves = [
+            block
+            for start, end in merge_intervals(intervals)
+            for block in cidr_blocks(start, end, bits)
+        ]
+        starts = [start for start, _ in leaves]
+        ends = [start + (1 << (bits - prefixlen)) - 1 for start, prefixlen in leaves]
+        covered = [0]
+        for start, end in zip(starts, ends):
+            covered.append(covered[-1] + end - start + 1)
+
+        # Node i is the smallest supernet of leaves i and i + 1
+        prefixlens = [
+            bits - (ends[i] ^ starts[i + 1]).bit_length()
+            for i in range(len(leaves) - 1)
+        ]
+        count = len(prefixlens)
+
+        # Nodes with a shorter prefix on each side are ancestors, the closest
+        # ones bound the leaves covered by the node
+        left = [-1] * count
+        right = [count] * count
+        stack = []
+        for i, prefixlen in enumerate(prefixlens):
+            while stack and prefixlens[stack[-1]] > prefixlen:
+                right[stack.pop()] = i
+            left[i] = stack[-1] if stack else -1
+            stack.append(i)
+
+        parents = []
+        costs = []
+        gains = []
+        for i, prefixlen in enumerate(prefixlens):
+            ancestors = [j for j in (left[i], right[i]) if 0 <= j < count]
+            parents.append(
+                max(ancestors, key=prefixlens.__getitem__) if ancestors else -1
+            )
+            first_leaf = left[i] + 1
+            last_leaf = right[i]
+            costs.append(
+                (1 << (bits - prefixlen))
+                - (covered[last_leaf + 1] - covered[first_leaf])
+            )
+            gains.append(last_leaf - first_leaf)
+
+        heap = [
+            (costs[i] / gains[i], costs[i], i)
+            for i in range(count)
+            if prefixlens[i] >= min_prefixlen[version]
+        ]
+        heapq.heapify(heap)
+        merged = [False] * count
+        while heap:
+            _, cost, i = heapq.heappop(heap)
+            if merged[i] or cost != costs[i] or used + cost > collateral:
+                # Outdated, or too expensive until descendants are merged
+                continue
+            ancestor = parents[i]
+            while ancestor != -1 and not merged[ancestor]:
+                ancestor = parents[ancestor]
+            if ancestor != -1:
+                # Already covered by a merged ancestor
+                continue
+
+            merged[i] = True
+            used += cost
+            gain = gains[i]
+            ancestor = parents[i]
+            while ancestor != -1:
+                costs[ancestor] -= cost
+                gains[ancestor] -= gain
+                if prefixlens[ancestor] >= min_prefixlen[version]:
+                    heapq.heappush(
+                        heap,
+                        (costs[ancestor] / gains[ancestor], costs[ancestor], ancestor),
+                    )
+                ancestor = parents[ancestor]
+
+        # Extend the leaves covered by merged nodes to their supernet
+        for i in range(count):
+            if merged[i]:
+                mask = (1 << (bits - prefixlens[i])) - 1
+                start = starts[i] & ~mask
+                for leaf in range(left[i] + 1, right[i] + 1):
+                    starts[leaf] = start
+                    ends[leaf] = start | mask
+
+        network_class = IPv4Network if version == 4 else IPv6Network
+        for start, end in merge_intervals(zip(starts, ends)):
+            for block in cidr_blocks(start, end, bits):
+                result.append(network_class(block))
+
+    return result, used
+
+
+def format_setting(networks):
+    """Return the value of the `BLOCKED_IPS` setting for a list of networks."""
+
+    return ",".join(
+        str(n.network_address) if n.num_addresses == 1 else str(n) for n in networks
+    )
@@ -14,8 +14,8 @@ seconds instead.
 
 Alternative methods here: https://devcenter.heroku.com/articles/logging#view-logs
 
-2) Populate `blocked_ip_setting` with the IPs stored in the mozilla-pontoon app
-settings.
+2) Populate `BLOCKED_IP_SETTING` in blocked_ips.py with the IPs stored in the
+mozilla-pontoon app settings.
 
 Open https://dashboard.heroku.com/apps/mozilla-pontoon/resources
 
@@ -24,22 +24,201 @@ value as is.
 
 3) Update the `BLOCKED_IPS` config var with listed IP addresses.
 
+With `--latency`, all router fields are parsed instead, to list the endpoints
+(see path_normalizer.py) and IPs using the most dyno time (with p50/p95/p99 of
+the service time), status codes, router errors (e.g. H12) and bytes served.
+Only the LATENCY_IPS IPs with the most requests are tracked (see
+heavy_hitters.py), so that memory doesn't grow with the number of IPs: the
+time and bytes of an IP are counted from the moment it's tracked.
+
+The log file is memory mapped and searched as bytes, so memory use doesn't
+grow with the size of the capture. With `--processes`, the file is split into
+chunks read in parallel.
+
+With `--stream`, router lines are read from stdin as they arrive instead, and
+IPs are listed as soon as their number of requests in one of the sliding
+windows (by default the last 60 seconds and 5 minutes) reaches the threshold.
+
 Usage:
     python check_ips_heroku_log.py log.txt
     python check_ips_heroku_log.py --threshold 50 log.txt
+    python check_ips_heroku_log.py --processes 4 log.txt
+    python check_ips_heroku_log.py --latency log.txt
+    heroku logs --tail --app mozilla-pontoon | python check_ips_heroku_log.py --stream
 """
 
-from ipaddress import ip_address, ip_network
+from blocked_ips import BlockedIPs
+from collections import Counter, deque
+from heavy_hitters import SpaceSaving
+from heroku_json_log import forwarded_ip
+from ipaddress import ip_address
+from mapped_log import count_matches
 from os.path import isfile
+from path_normalizer import PathNormalizer
+from quantile_sketch import QuantileSketch
+from router_log import parse_router_line
 import argparse
 import re
 import sys
+import time
+
+# Same as the filter used for streams, matching bytes of memory mapped files
+FORWARDED_FILTER = re.compile(rb'fwd="(.*)"')
+
+# Number of IPs with the most requests tracked by --latency
+LATENCY_IPS = 10000
+
+
+class SlidingWindowCounter:
+    """
+    Count occurrences of keys over the last `window` seconds.
+
+    Counts are stored in buckets of `bucket_size` seconds, dropped once they
+    are out of the window, so memory only depends on the keys seen in the
+    window.
+    """
+
+    def __init__(self, window, bucket_size=1):
+        self.window = window
+        self.bucket_size = bucket_size
+        self.buckets = deque()
+        self.counts = Counter()
+
+    def expire(self, now):
+        while self.buckets and self.buckets[0][0] <= now - self.window:
+            _, bucket = self.buckets.popleft()
+            self.counts.subtract(bucket)
+            for key in bucket:
+                if self.counts[key] <= 0:
+                    del self.counts[key]
+
+    def add(self, key, now):
+        """Count `key` at time `now`, and return its count in the window."""
+
+        self.expire(now)
+        bucket_start = now - now % self.bucket_size
+        if not self.buckets or self.buckets[-1][0] != bucket_start:
+            self.buckets.append((bucket_start, Counter()))
+        self.buckets[-1][1][key] += 1
+        self.counts[key] += 1
+
+        return self.counts[key]
+
+
+def extract_ip(line, filter):
+    match = filter.search(line)
+    if not match:
+        return None
+
+    return forwarded_ip(match.group(1))
+
+
+def stream_ips(lines, filter, windows, threshold, blocked_ips):
+    counters = [SlidingWindowCounter(window) for window in windows]
+    for line in lines:
+        ip = extract_ip(line, filter)
+        if ip is None:
+            continue
+
+        now = time.monotonic()
+        counts = [counter.add(ip, now) for counter in counters]
+        # Only report the IP when it crosses the threshold in a window
+        if threshold in counts:
+            windows_counts = ", ".join(
+                f"{count} in the last {counter.window}s"
+                for counter, count in zip(counters, counts)
+            )
+            print(
+                f"{time.strftime('%H:%M:%S')} {ip}"
+                f"{' (blocked)' if ip in blocked_ips else ''}: {windows_counts}",
+                flush=True,
+            )
+
+
+def print_latency(message, sketches, served_bytes, top):
+    print(message)
+    if not sketches:
+        print("  -")
+    ranked = sorted(sketches.items(), key=lambda item: item[1].total, reverse=True)
+    for key, sketch in ranked[:top]:
+        percentiles = ", ".join(
+            f"p{int(q * 100)} {sketch.quantile(q):.0f}ms" for q in (0.5, 0.95, 0.99)
+        )
+        print(
+            f"  {key}: {sketch.count} requests, {sketch.total / 1000:.1f}s service "
+            f"({percentiles}), {served_bytes[key]} bytes"
+        )
+
+
+def analyze_latency(lines, top, tracked_ips=LATENCY_IPS):
+    path_sketches = {}
+    # Sketches are only kept for IPs of the summary
+    ip_requests = SpaceSaving(tracked_ips)
+    ip_sketches = {}
+    path_bytes = Counter()
+    ip_bytes = Counter()
+    status_codes = Counter()
+    error_codes = Counter()
+    normalize = PathNormalizer()
+
+    for line in lines:
+        fields = parse_router_line(line)
+        if fields is None:
+            continue
+
+        path = normalize(fields["path"])
+        ip = fields["ip"]
+        service = fields.get("service", 0)
+        served_bytes = fields.get("bytes", 0)
+        if not isinstance(service, int):
+            service = 0
+        if not isinstance(served_bytes, int):
+            served_bytes = 0
+
+        path_sketches.setdefault(path, QuantileSketch()).add(service)
+        path_bytes[path] += served_bytes
+        ip_requests[ip] += 1
+        ip_sketches.setdefault(ip, QuantileSketch()).add(service)
+        ip_bytes[ip] += served_bytes
+        if len(ip_sketches) > 2 * tracked_ips:
+            # Drop IPs evicted from the summary
+            for evicted in [key for key in ip_sketches if key not in ip_requests]:
+                del ip_sketches[evicted]
+                del ip_bytes[evicted]
+        status_codes[fields.get("status")] += 1
+        if fields.get("at") == "error":
+            error_codes[fields.get("code", "unknown")] += 1
+
+    print_latency(
+        "\nEndpoints using the most dyno time:", path_sketches, path_bytes, top
+    )
+    ip_sketches = {ip: ip_sketches[ip] for ip in ip_sketches if ip in ip_requests}
+    print_latency("\nIPs using the most dyno time:", ip_sketches, ip_bytes, top)
+
+    print("\nStatus codes:")
+    for status, count in status_codes.most_common():
+        print(f"  {status}: {count}")
+    server_errors = sum(
+        count
+        for status, count in status_codes.items()
+        if isinstance(status, int) and status >= 500
+    )
+    print(f"  5xx: {server_errors} (503: {status_codes[503]})")
+
+    print("\nRouter errors:")
+    if not error_codes:
+        print("  -")
+    for code, count in error_codes.most_common():
+        print(f"  {code}: {count}")
+
+    print(f"\nBytes served: {sum(path_bytes.values())}")
 
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "log_file",
+        nargs="?",
         help="Path to log file",
     )
     parser.add_argument(
@@ -48,54 +227,74 @@ def main():
         default=10,
         help="Threshold under which IPs are ignored",
     )
+    parser.add_argument(
+        "--latency",
+        required=False,
+        action="store_true",
+        default=False,
+        help="Report service time, status codes and bytes served instead of IPs",
+    )
+    parser.add_argument(
+        "--top",
+        required=False,
+        type=int,
+        default=20,
+        help="Number of paths and IPs listed with --latency",
+    )
+    parser.add_argument(
+        "--stream",
+        required=False,
+        action="store_true",
+        default=False,
+        help="Read log lines from stdin and list IPs as soon as they cross the threshold",
+    )
+    parser.add_argument(
+        "--windows",
+        required=False,
+        default="60,300",
+        help="Comma separated list of sliding windows in seconds for --stream",
+    )
+    parser.add_argument(
+        "--processes",
+        required=False,
+        type=int,
+        default=None,
+        help="Number of processes used to read the log file (default: number of CPUs)",
+    )
     args = parser.parse_args()
     threshold = int(args.threshold)
     log_file = args.log_file
 
-    if not isfile(log_file):
+    if args.stream:
+        windows = [int(window) for window in args.windows.split(",")]
+    elif log_file is None:
+        sys.exit("A log file is required without --stream.")
+    elif not isfile(log_file):
         sys.exit(f"File {log_file} doesn't exist.")
 
     ips = {}
     filter = re.compile(r"fwd=\"(.*)\"")
 
-    # Copy from Heroku settings
-    blocked_ip_setting = ""
+    blocked_ips = BlockedIPs()
 
-    BLOCKED_IPS = []
-    BLOCKED_IP_RANGES = []
-    for ip in blocked_ip_setting.split(","):
-        ip = ip.strip()
-        if ip == "":
-            continue
+    if args.stream:
         try:
-            # If the IP is valid, store it directly as string
-            ip_obj = ip_address(ip)
-            BLOCKED_IPS.append(ip)
-        except ValueError:
-            try:
-                # Check if it's a valid IP range (CIDR notation)
-                ip_obj = ip_network(ip, strict=False)
-                BLOCKED_IP_RANGES.append(ip_obj)
-            except ValueError:
-                print(f"Invalid IP or IP range defined in BLOCKED_IPS: {ip}")
-
-    with open(log_file) as f:
-        content = f.readlines()
-        for line in content:
-            match = filter.search(line)
-            if match:
-                ip = match.group(1)
-                num_ips = len(ip.split(","))
-                if num_ips > 1:
-                    ip = (
-                        ip.split(",")[0].strip()
-                        if num_ips == 2
-                        else ip.split(",")[1].strip()
-                    )
-                if ip not in ips:
-                    ips[ip] = 1
-                else:
-                    ips[ip] += 1
+            stream_ips(sys.stdin, filter, windows, threshold, blocked_ips)
+        except KeyboardInterrupt:
+            pass
+        return
+
+    if args.latency:
+        with open(log_file, encoding="utf-8", errors="replace") as f:
+            analyze_latency(f, args.top)
+        return
+
+    # Count forwarded values as bytes, they're only decoded once each
+    for value, count in count_matches(
+        log_file, FORWARDED_FILTER, args.processes
+    ).items():
+        ip = forwarded_ip(value.decode("utf-8", errors="replace"))
+        ips[ip] = ips.get(ip, 0) + count
 
     sorted_ips = dict(sorted(ips.items(), key=lambda item: item[1], reverse=True))
 
@@ -115,14 +314,7 @@ def main():
             continue
 
         # Ignore IPs already blocked
-        blocked = False
-        if ip in BLOCKED_IPS:
-            blocked = True
-        for ip_range in BLOCKED_IP_RANGES:
-            if ip_obj in ip_range:
-                blocked = True
-
-        type = "blocked" if blocked else "high"
+        type = "blocked" if blocked_ips.contains_address(ip_obj) else "high"
         output[type]["ips"].append(f"  {ip}: {count}")
 
     for data in output.values():
@@ -13,11 +13,23 @@ seconds instead.
 
 Alternative methods here: https://devcenter.heroku.com/articles/logging#view-logs
 
+The log file can include JSON lines (Papertrail format) or router lines as
+saved by the Heroku CLI. It's memory mapped, and only lines including the IP
+are parsed.
+
+With `--group`, paths are grouped by Pontoon endpoint (e.g. all translate views
+as /<locale>/<project>/<resource>/), see path_normalizer.py.
+
 Usage:
-    python check_paths_ip_heroku_log.py log.txt 192.168.0.1
+    python check_urls_ip_heroku_log.py log.txt --ip 192.168.0.1
+    python check_urls_ip_heroku_log.py log.txt --group --ip 192.168.0.1
 """
 
+from heroku_json_log import forwarded_ip
+from mapped_log import iter_lines_with
 from os.path import isfile
+from path_normalizer import PathNormalizer
+from router_log import parse_router_line
 import argparse
 import json
 import sys
@@ -34,24 +46,40 @@ def main():
         required=True,
         help="IP to check",
     )
+    parser.add_argument(
+        "--group",
+        required=False,
+        action="store_true",
+        default=False,
+        help="Group paths by Pontoon endpoint",
+    )
     args = parser.parse_args()
     log_file = args.log_file
 
     if not isfile(log_file):
         sys.exit(f"File {log_file} doesn't exist.")
 
+    normalize = PathNormalizer() if args.group else None
     paths = {}
-    with open(log_file) as f:
-        content = f.readlines()
-        for line in content:
+    # Only lines including the IP are decoded and parsed
+    for line in iter_lines_with(log_file, args.ip.encode()):
+        if line.lstrip().startswith(b"{"):
             json_line = json.loads(line)
-            ip = json_line.get("heroku", {}).get("fwd", "")
+            ip = forwarded_ip(json_line.get("heroku", {}).get("fwd", ""))
             path = json_line.get("heroku", {}).get("path", "")
-            if ip == args.ip:
-                if path not in paths:
-                    paths[path] = 1
-                else:
-                    paths[path] += 1
+        else:
+            fields = parse_router_line(line.decode("utf-8", errors="replace"))
+            if fields is None:
+                continue
+            ip = fields["ip"]
+            path = fields["path"]
+        if ip == args.ip:
+            if normalize:
+                path = normalize(path)
+            if path not in paths:
+                paths[path] = 1
+            else:
+                paths[path] += 1
 
     sorted_paths = dict(sorted(paths.items(), key=lambda item: item[1], reverse=True))
 
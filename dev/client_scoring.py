@@ -0,0 +1,382 @@
+"""
+Per-client features and abuse scores from Papertrail's archives (JSON or
+native json.gz format).
+
+A single pass over the archives builds, for each IP:
+- the request rate (requests per minute between first and last request)
+- the number of distinct paths, estimated with a HyperLogLog sketch of
+  PATH_REGISTERS registers (standard error of about 13%)
+- the share of API and HTML (non-API, non-static) requests
+- the entropy of its user agents (high for clients rotating user agents),
+  counted in USER_AGENT_BUCKETS buckets of hashed user agents
+- the ratio of 4xx responses
+
+Clients are stored in a ClientTable: NumPy columns with one row per IP, using a
+fixed amount of memory per IP (about 160 bytes, plus the IP itself). Lines are
+added in batches of BATCH_SIZE with vectorised operations, and the tables of
+all archives are merged exactly.
+
+Clients with fewer than `min_requests` requests are not scored: archives are
+first read to count requests per IP in a summary of CANDIDATE_IPS IPs (see
+heavy_hitters.py), so that only IPs which can reach `min_requests` get a row,
+whatever the number of IPs in the logs. If the summary can't tell (more than
+CANDIDATE_IPS IPs with that many requests), all IPs get a row.
+
+Features are then standardized and combined with WEIGHTS using NumPy, to rank
+clients by score. NumPy is required (`pip install numpy`).
+
+Usage:
+    from client_scoring import scan_clients, score_clients
+
+    clients = scan_clients(archive_files, min_requests=100)
+    ips, features, scores = score_clients(clients, min_requests=100)
+"""
+
+from array import array
+from functools import partial
+from heavy_hitters import SpaceSaving
+from heroku_json_log import (
+    extract_ip,
+    extract_time,
+    extract_user_agent,
+    iter_log_lines,
+    map_archives,
+    parse_line,
+    scan_archives,
+)
+from zlib import crc32
+import numpy as np
+
+# Number of registers (one byte each) of the distinct paths sketch
+PATH_BITS = 6
+PATH_REGISTERS = 1 << PATH_BITS
+# Number of counters of the user agents histogram
+USER_AGENT_BITS = 4
+USER_AGENT_BUCKETS = 1 << USER_AGENT_BITS
+
+# Number of lines added to a ClientTable at once
+BATCH_SIZE = 65536
+
+# Number of IPs counted to find the clients with at least `min_requests`
+# requests
+CANDIDATE_IPS = 20000
+
+# Kinds of requests
+STATIC, API, HTML = 0, 1, 2
+
+FEATURES = [
+    "requests",
+    "rate",
+    "distinct_paths",
+    "api_share",
+    "html_share",
+    "user_agent_entropy",
+    "client_error_ratio",
+]
+
+# Weights of standardized features in the score
+WEIGHTS = {
+    "rate": 2.0,
+    "distinct_paths": 1.0,
+    "api_share": 0.5,
+    "html_share": 0.5,
+    "user_agent_entropy": 1.0,
+    "client_error_ratio": 1.0,
+}
+
+
+def mix_hashes(hashes):
+    """
+    Spread CRC32 values over the high bits (Fibonacci hashing), which select
+    the register or bucket.
+    """
+
+    return (hashes.astype(np.uint64) * 0x9E3779B1 & 0xFFFFFFFF).astype(np.uint32)
+
+
+class ClientTable:
+    """Features of each IP, stored as NumPy columns with one row per IP."""
+
+    columns = [
+        "requests",
+        "first_time",
+        "last_time",
+        "api",
+        "html",
+        "client_errors",
+        "paths",
+        "user_agents",
+    ]
+
+    def __init__(self, capacity=1024):
+        # IPs in order of their row
+        self.rows = {}
+        self.requests = np.zeros(capacity, dtype=np.uint32)
+        self.first_time = np.full(capacity, np.inf)
+        self.last_time = np.full(capacity, -np.inf)
+        self.api = np.zeros(capacity, dtype=np.uint32)
+        self.html = np.zeros(capacity, dtype=np.uint32)
+        self.client_errors = np.zeros(capacity, dtype=np.uint32)
+        self.paths = np.zeros((capacity, PATH_REGISTERS), dtype=np.uint8)
+        self.user_agents = np.zeros((capacity, USER_AGENT_BUCKETS), dtype=np.uint32)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def row(self, ip):
+        """Return the row of `ip`, adding it if needed."""
+
+        row = self.rows.get(ip)
+        if row is None:
+            row = self.rows[ip] = len(self.rows)
+            if row == len(self.requests):
+                self.resize(max(row + row // 2, 1024))
+
+        return row
+
+    def resize(self, capacity):
+        for name in self.columns:
+            column = getattr(self, name)
+            resized = np.zeros((capacity,) + column.shape[1:], dtype=column.dtype)
+            if name == "first_time":
+                resized[:] = np.inf
+            elif name == "last_time":
+                resized[:] = -np.inf
+            size = min(capacity, len(column))
+            resized[:size] = column[:size]
+            setattr(self, name, resized)
+
+    def trim(self):
+        """Drop unused rows, before storing or sending the table."""
+
+        self.resize(len(self.rows))
+
+    def add_lines(self, rows, times, kinds, client_errors, path_hashes, ua_hashes):
+        """Add a batch of lines, given as arrays with one item per line."""
+
+        size = len(self.requests)
+        rows = np.asarray(rows, dtype=np.int64)
+        self.requests += np.bincount(rows, minlength=size).astype(np.uint32)
+        times = np.asarray(times, dtype=np.float64)
+        # fmin() and fmax() ignore lines without time (NaN)
+        np.fmin.at(self.first_time, rows, times)
+        np.fmax.at(self.last_time, rows, times)
+        kinds = np.asarray(kinds)
+        self.api += np.bincount(rows, weights=kinds == API, minlength=size).astype(
+            np.uint32
+        )
+        self.html += np.bincount(rows, weights=kinds == HTML, minlength=size).astype(
+            np.uint32
+        )
+        client_errors = np.asarray(client_errors)
+        self.client_errors += np.bincount(
+            rows, weights=client_errors, minlength=size
+        ).astype(np.uint32)
+
+        # HyperLogLog: the first bits select the register, which keeps the
+        # highest position of the first 1 in the other bits
+        path_hashes = mix_hashes(np.asarray(path_hashes))
+        registers = path_hashes >> (32 - PATH_BITS)
+        remaining = path_hashes & ((1 << (32 - PATH_BITS)) - 1)
+        _, bit_length = np.frexp(remaining.astype(np.float64))
+        ranks = (32 - PATH_BITS + 1 - bit_length).astype(np.uint8)
+        np.maximum.at(self.paths, (rows, registers), ranks)
+
+        ua_hashes = mix_hashes(np.asarray(ua_hashes))
+        np.add.at(self.user_agents, (rows, ua_hashes >> (32 - USER_AGENT_BITS)), 1)
+
+    def update(self, other):
+        """Merge the rows of another table."""
+
+        if not other.rows:
+            return
+        # Make room for new IPs at once
+        capacity = len(self) + sum(1 for ip in other.rows if ip not in self.rows)
+        if capacity > len(self.requests):
+            self.resize(capacity + capacity // 2)
+        rows = np.fromiter(
+            (self.row(ip) for ip in other.rows), dtype=np.int64, count=len(other)
+        )
+        size = len(other)
+        # Rows of `other` are distinct, no need for ufunc.at()
+        self.requests[rows] += other.requests[:size]
+        self.first_time[rows] = np.minimum(
+            self.first_time[rows], other.first_time[:size]
+        )
+        self.last_time[rows] = np.maximum(self.last_time[rows], other.last_time[:size])
+        self.api[rows] += other.api[:size]
+        self.html[rows] += other.html[:size]
+        self.client_errors[rows] += other.client_errors[:size]
+        self.paths[rows] = np.maximum(self.paths[rows], other.paths[:size])
+        self.user_agents[rows] += other.user_agents[:size]
+
+
+def new_batch():
+    """Return arrays of rows, times, kinds, client errors, path and UA hashes."""
+
+    return array("q"), array("d"), array("b"), array("b"), array("I"), array("I")
+
+
+def scan_archive_clients(ips, archive_file):
+    """Return a ClientTable of an archive, with only `ips` if it's not None."""
+
+    clients = ClientTable()
+    batch = new_batch()
+    rows, times, kinds, client_errors, path_hashes, ua_hashes = batch
+    for line in iter_log_lines(archive_file):
+        record = parse_line(line)
+        ip = extract_ip(record)
+        if not ip or (ips is not None and ip not in ips):
+            continue
+        heroku = record.get("heroku", {})
+        path = heroku.get("path", "") or ""
+        status = heroku.get("status")
+        timestamp = extract_time(record)
+
+        rows.append(clients.row(ip))
+        times.append(np.nan if timestamp is None else timestamp)
+        if path.startswith("/api/") or path.startswith("/graphql"):
+            kinds.append(API)
+        elif path.startswith("/static/"):
+            kinds.append(STATIC)
+        else:
+            kinds.append(HTML)
+        try:
+            client_errors.append(400 <= int(status) < 500)
+        except (TypeError, ValueError):
+            client_errors.append(False)
+        # CRC32 is stable across processes, unlike hash()
+        path_hashes.append(crc32(path.encode()))
+        ua_hashes.append(crc32((extract_user_agent(record) or "").encode()))
+        if len(rows) == BATCH_SIZE:
+            clients.add_lines(*batch)
+            batch = new_batch()
+            rows, times, kinds, client_errors, path_hashes, ua_hashes = batch
+    if rows:
+        clients.add_lines(*batch)
+    clients.trim()
+
+    return clients
+
+
+def find_candidates(archive_files, min_requests, processes=None, checkpoint_dir=None):
+    """
+    Return the set of IPs which can have at least `min_requests` requests, or
+    None if it can't be told with a summary of CANDIDATE_IPS IPs.
+    """
+
+    summary = scan_archives(
+        archive_files,
+        {"ips": extract_ip},
+        processes=processes,
+        checkpoint_dir=checkpoint_dir,
+        counter_factories={"ips": partial(SpaceSaving, CANDIDATE_IPS)},
+    )["ips"]
+    # Counts are never underestimated, and IPs missing from the summary have
+    # at most floor() requests
+    if summary.floor() >= min_requests:
+        return None
+
+    return frozenset(ip for ip, count in summary.items() if count >= min_requests)
+
+
+def scan_clients(archive_files, processes=None, checkpoint_dir=None, min_requests=1):
+    """
+    Return a ClientTable with the clients of all archives, including at least
+    those with `min_requests` requests or more.
+    """
+
+    ips = None
+    if min_requests > 1:
+        ips = find_candidates(archive_files, min_requests, processes, checkpoint_dir)
+    clients = None
+    for _, archive_clients in map_archives(
+        partial(scan_archive_clients, ips), archive_files, processes, checkpoint_dir
+    ):
+        # The table of the first archive is used for all of them
+        if clients is None:
+            clients = archive_clients
+        else:
+            clients.update(archive_clients)
+    if clients is None:
+        return ClientTable()
+    clients.trim()
+
+    return clients
+
+
+def distinct_paths(registers):
+    """
+    Return the number of distinct paths estimated from HyperLogLog registers
+    (one row per client).
+    """
+
+    # Bias correction for 16 registers or more
+    alpha = 0.7213 / (1 + 1.079 / PATH_REGISTERS)
+    raw = alpha * PATH_REGISTERS**2 / np.exp2(-registers.astype(np.float64)).sum(1)
+    # Linear counting is more accurate for small numbers of paths
+    zeros = np.count_nonzero(registers == 0, axis=1)
+    linear = PATH_REGISTERS * np.log(PATH_REGISTERS / np.maximum(zeros, 1))
+
+    return np.where((raw <= 2.5 * PATH_REGISTERS) & (zeros > 0), linear, raw)
+
+
+def user_agent_entropy(user_agents):
+    """Return the entropy of user agent histograms (one row per client)."""
+
+    counts = user_agents.astype(np.float64)
+    probabilities = counts / np.maximum(counts.sum(axis=1, keepdims=True), 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        terms = np.where(probabilities > 0, probabilities * np.log2(probabilities), 0)
+
+    return -terms.sum(axis=1)
+
+
+def score_clients(clients, min_requests=1):
+    """
+    Return the list of IPs, the matrix of FEATURES (one row per IP) and the
+    scores of clients with at least `min_requests` requests, sorted by score.
+    """
+
+    size = len(clients)
+    selected = np.flatnonzero(clients.requests[:size] >= min_requests)
+    if not len(selected):
+        return [], np.zeros((0, len(FEATURES))), np.zeros(0)
+
+    requests = clients.requests[selected].astype(np.float64)
+    # Requests per minute, using at least one minute as duration (clients
+    # without any time have an infinite negative duration)
+    duration = clients.last_time[selected] - clients.first_time[selected]
+    rate = requests / (np.maximum(duration, 60) / 60)
+    # Sketches are converted by chunks of rows, to limit the size of temporary
+    # arrays (one float per register or bucket)
+    step = BATCH_SIZE // PATH_REGISTERS
+    chunks = [selected[i : i + step] for i in range(0, len(selected), step)]
+    features = np.column_stack(
+        [
+            requests,
+            rate,
+            np.concatenate([distinct_paths(clients.paths[rows]) for rows in chunks]),
+            clients.api[selected] / requests,
+            clients.html[selected] / requests,
+            np.concatenate(
+                [user_agent_entropy(clients.user_agents[rows]) for rows in chunks]
+            ),
+            clients.client_errors[selected] / requests,
+        ]
+    )
+
+    # Standardize features (log scale for counts), then weight them
+    columns = [FEATURES.index(name) for name in WEIGHTS]
+    weighted = features[:, columns].copy()
+    for index, name in enumerate(WEIGHTS):
+        if name in ("rate", "distinct_paths"):
+            weighted[:, index] = np.log1p(weighted[:, index])
+    std = weighted.std(axis=0)
+    standardized = (weighted - weighted.mean(axis=0)) / np.where(std > 0, std, 1)
+    scores = standardized @ np.array(list(WEIGHTS.values()))
+
+    order = np.argsort(-scores, kind="stable")
+    ips = list(clients.rows)
+
+    return [ips[selected[i]] for i in order], features[order], scores[order]
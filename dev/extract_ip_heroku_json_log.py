@@ -2,28 +2,70 @@
 This script can be used to extract the number of requests for IPs from
 Papertrail's archives in JSON (or native json.gz) format.
 
+IPs already blocked are flagged, populate `BLOCKED_IP_SETTING` in blocked_ips.py
+with the `BLOCKED_IPS` setting of the mozilla-pontoon app.
+
+With `--max-keys`, only the given number of IPs is kept in memory and counts
+are approximate (see heavy_hitters.py).
+
+With `--asn-db`, the network (ASN and country) of each IP is displayed, from
+an offline database (see ip_database.py). With `--group-by asn` or
+`--group-by country`, requests of all IPs are summed by network instead, to
+spot floods distributed across IPs that each stay under the threshold.
+
+With `--checkpoint`, the counts of each archive are saved in the given folder
+as soon as they're computed: running again after an interruption, or later on
+the same folder with new archives, only reads archives that weren't counted
+yet or that changed since.
+
 Usage:
     python extract_ip_heroku_json_log.py ~/path_to_logs
+    python extract_ip_heroku_json_log.py --max-keys 100000 ~/path_to_logs
+    python extract_ip_heroku_json_log.py --asn-db ip2asn-combined.tsv.gz ~/path_to_logs
+    python extract_ip_heroku_json_log.py --asn-db ip2asn-combined.tsv.gz --group-by asn ~/path_to_logs
+    python extract_ip_heroku_json_log.py --checkpoint ~/ip_checkpoints ~/path_to_logs
 """
 
+from blocked_ips import BlockedIPs
+from functools import partial
+from heavy_hitters import SpaceSaving
+from heroku_json_log import (
+    add_checkpoint_argument,
+    extract_ip,
+    find_archive_files,
+    scan_archives,
+)
+from heroku_log_index import archive_ids, count_ips, ingest, open_index
+from ip_database import IPDatabase, describe_network
+from ipaddress import ip_address
 import argparse
-import json
-import glob
-import gzip
-import os
 import sys
-from ipaddress import ip_address, ip_network
 
 
-def iter_log_lines(fp):
-    if fp.endswith(".gz"):
-        with gzip.open(fp, "rt", errors="ignore") as f:
-            for line in f:
-                yield line
-    else:
-        with open(fp, "rt", errors="ignore") as f:
-            for line in f:
-                yield line
+def print_groups(ip_stats, database, group_by, threshold):
+    """Print the number of requests and IPs by ASN or country."""
+
+    requests = {}
+    ips = {}
+    labels = {}
+    for ip, count in ip_stats.items():
+        network = database.lookup(ip)
+        if group_by == "asn":
+            key = network.asn if network else None
+            label = describe_network(network)
+            if network:
+                # Countries can differ between ranges of the same ASN
+                label = describe_network(network._replace(country=None))
+        else:
+            key = network.country if network else None
+            label = key or "unknown country"
+        labels.setdefault(key, label)
+        requests[key] = requests.get(key, 0) + count
+        ips[key] = ips.get(key, 0) + 1
+
+    for key, count in sorted(requests.items(), key=lambda x: x[1], reverse=True):
+        if count >= threshold:
+            print(f"{labels[key]}: {count} ({ips[key]} IPs)")
 
 
 def main():
@@ -38,55 +80,76 @@ def main():
         default=1000,
         help="Threshold under which IPs are ignored",
     )
+    parser.add_argument(
+        "--processes",
+        required=False,
+        type=int,
+        default=None,
+        help="Number of processes used to read archives (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--asn-db",
+        required=False,
+        help="Path to ASN database (CSV or TSV, see ip_database.py) to display the network of IPs",
+    )
+    parser.add_argument(
+        "--group-by",
+        required=False,
+        choices=["asn", "country"],
+        help="Sum requests of all IPs by ASN or country (requires --asn-db)",
+    )
+    add_checkpoint_argument(parser)
+    parser.add_argument(
+        "--index",
+        required=False,
+        help="Path to index file, created or updated with new archives if needed",
+    )
+    parser.add_argument(
+        "--max-keys",
+        required=False,
+        type=int,
+        default=None,
+        help="Approximate counts keeping at most this number of IPs in memory",
+    )
     args = parser.parse_args()
     log_path = args.log_path
+    if args.group_by and not args.asn_db:
+        sys.exit("--group-by requires --asn-db.")
+    if args.index and (args.checkpoint or args.max_keys):
+        sys.exit("--checkpoint and --max-keys can't be used with --index.")
 
-    archive_files = glob.glob(os.path.join(log_path, "*.json")) + glob.glob(
-        os.path.join(log_path, "*.json.gz")
-    )
+    archive_files = find_archive_files(log_path)
     if not archive_files:
         sys.exit(f"File {log_path} doesn't include any log file.")
     else:
         print(f"Found {len(archive_files)} log files.")
 
-    # Copy from Heroku settings
-    blocked_ip_setting = ""
+    blocked_ips = BlockedIPs()
+    database = IPDatabase(args.asn_db) if args.asn_db else None
 
-    BLOCKED_IPS = []
-    BLOCKED_IP_RANGES = []
-    for ip in blocked_ip_setting.split(","):
-        ip = ip.strip()
-        if ip == "":
-            continue
-        try:
-            # If the IP is valid, store it directly as string
-            ip_obj = ip_address(ip)
-            BLOCKED_IPS.append(ip)
-        except ValueError:
-            try:
-                # Check if it's a valid IP range (CIDR notation)
-                ip_obj = ip_network(ip, strict=False)
-                BLOCKED_IP_RANGES.append(ip_obj)
-            except ValueError:
-                print(f"Invalid IP or IP range defined in BLOCKED_IPS: {ip}")
-
-    ip_stats = {}
-    for archive_file in archive_files:
-        for line in iter_log_lines(archive_file):
-            json_line = json.loads(line)
-            ip = json_line.get("heroku", {}).get("fwd", "")
-            if ip:
-                num_ips = len(ip.split(","))
-                if num_ips > 1:
-                    ip = (
-                        ip.split(",")[0].strip()
-                        if num_ips == 2
-                        else ip.split(",")[1].strip()
-                    )
-                if ip not in ip_stats:
-                    ip_stats[ip] = 1
-                else:
-                    ip_stats[ip] += 1
+    if args.index:
+        connection = open_index(args.index)
+        ingest(connection, archive_files, args.processes)
+        ip_stats = count_ips(connection, archive_ids(connection, archive_files))
+    else:
+        counter_factories = {}
+        if args.max_keys:
+            counter_factories["ips"] = partial(SpaceSaving, args.max_keys)
+        ip_stats = scan_archives(
+            archive_files,
+            {"ips": extract_ip},
+            processes=args.processes,
+            checkpoint_dir=args.checkpoint,
+            counter_factories=counter_factories,
+        )["ips"]
+        if args.max_keys:
+            print(
+                f"Approximate counts, overestimated by at most {ip_stats.max_error()}."
+            )
+
+    if args.group_by:
+        print_groups(ip_stats, database, args.group_by, int(args.threshold))
+        return
 
     ip_stats = {
         ip: count for ip, count in ip_stats.items() if count >= int(args.threshold)
@@ -99,14 +162,10 @@ def main():
         except ValueError:
             print(f"Invalid IP extracted from log: {ip}")
             continue
-        blocked = False
-        if ip in BLOCKED_IPS:
-            blocked = True
-        for ip_range in BLOCKED_IP_RANGES:
-            if ip_obj in ip_range:
-                blocked = True
-
-        print(f"{ip}{' (blocked)' if blocked else ''}: {count}")
+        blocked = blocked_ips.contains_address(ip_obj)
+        network = f" [{describe_network(database.lookup(ip))}]" if database else ""
+
+        print(f"{ip}{' (blocked)' if blocked else ''}: {count}{network}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,128 @@
+"""
+This script can be used to extract the number of requests per time bucket (by
+default per minute) from Papertrail's archives in JSON (or native json.gz)
+format, for all requests and for the IPs with the most requests.
+
+Without `--ip`, archives are read twice: once to find the top IPs, once to
+count their requests per bucket (only parsing lines including those IPs).
+
+Data is stored as CSV, with a column for all requests and one for each IP.
+
+Usage:
+    python extract_rate_heroku_json_log.py ~/path_to_logs
+    python extract_rate_heroku_json_log.py --bucket 1 --top 10 ~/path_to_logs
+    python extract_rate_heroku_json_log.py --ip 192.168.0.1 ~/path_to_logs
+"""
+
+from functools import partial
+from heroku_json_log import (
+    add_checkpoint_argument,
+    extract_ip,
+    extract_ip_time,
+    extract_request_time,
+    find_archive_files,
+    scan_archives,
+)
+from rate_histogram import RateHistogram
+import argparse
+import csv
+import sys
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "log_path",
+        help="Path to folder with log file (.json Heroku format)",
+    )
+    parser.add_argument(
+        "--bucket",
+        required=False,
+        type=int,
+        default=60,
+        help="Size of time buckets in seconds",
+    )
+    parser.add_argument(
+        "--top",
+        required=False,
+        type=int,
+        default=5,
+        help="Number of IPs with the most requests to include",
+    )
+    parser.add_argument(
+        "--ip",
+        required=False,
+        action="append",
+        default=[],
+        dest="watched_ips",
+        help="IP to include instead of the top IPs (can be repeated)",
+    )
+    parser.add_argument(
+        "--output",
+        required=False,
+        default="output.csv",
+        help="Path to CSV file",
+    )
+    parser.add_argument(
+        "--processes",
+        required=False,
+        type=int,
+        default=None,
+        help="Number of processes used to read archives (default: number of CPUs)",
+    )
+    add_checkpoint_argument(parser)
+    args = parser.parse_args()
+    log_path = args.log_path
+
+    archive_files = find_archive_files(log_path)
+    if not archive_files:
+        sys.exit(f"File {log_path} doesn't include any log file.")
+    else:
+        print(f"Found {len(archive_files)} log files.")
+
+    histogram = partial(RateHistogram, args.bucket)
+    ips = args.watched_ips
+    if ips:
+        counts = scan_archives(
+            archive_files,
+            {
+                "all": extract_request_time,
+                "ips": partial(extract_ip_time, frozenset(ips)),
+            },
+            processes=args.processes,
+            checkpoint_dir=args.checkpoint,
+            counter_factories={"all": histogram, "ips": histogram},
+        )
+        requests = counts["all"]
+        requests.update(counts["ips"])
+    else:
+        counts = scan_archives(
+            archive_files,
+            {"all": extract_request_time, "ips": extract_ip},
+            processes=args.processes,
+            checkpoint_dir=args.checkpoint,
+            counter_factories={"all": histogram},
+        )
+        requests = counts["all"]
+        ips = [ip for ip, _ in counts["ips"].most_common(args.top)]
+        if ips:
+            requests.update(
+                scan_archives(
+                    archive_files,
+                    {"ips": partial(extract_ip_time, frozenset(ips))},
+                    processes=args.processes,
+                    checkpoint_dir=args.checkpoint,
+                    needles=[ip.encode() for ip in ips],
+                    counter_factories={"ips": histogram},
+                )["ips"]
+            )
+
+    with open(args.output, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Time", "All requests"] + ips)
+        writer.writerows(requests.rows(["All requests"] + ips))
+    print(f"Data stored as {args.output}")
+
+
+if __name__ == "__main__":
+    main()
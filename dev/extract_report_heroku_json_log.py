@@ -0,0 +1,165 @@
+"""
+This script can be used to extract, in a single pass over Papertrail's archives
+in JSON (or native json.gz) format:
+- the number of requests for IPs
+- the paths requested by each IP in a watch list
+- the number of requests for user agents
+- the number of responses for each status code
+
+Each archive is decompressed and parsed once, instead of once for each of
+extract_ip_heroku_json_log.py, extract_urls_ip_heroku_json_log.py and
+extract_useragent_heroku_json_log.py.
+
+Usage:
+    python extract_report_heroku_json_log.py ~/path_to_logs
+    python extract_report_heroku_json_log.py --ip 192.168.0.1 --ip 192.168.0.2 ~/path_to_logs
+"""
+
+from functools import partial
+from heavy_hitters import SpaceSaving
+from heroku_json_log import (
+    add_checkpoint_argument,
+    extract_ip,
+    extract_paths_for_ips,
+    extract_status,
+    extract_user_agent,
+    find_archive_files,
+    scan_archives,
+)
+from heroku_log_index import (
+    archive_ids,
+    count_ips,
+    count_paths_for_ip,
+    count_status,
+    count_user_agents,
+    ingest,
+    open_index,
+)
+import argparse
+import sys
+
+
+def print_counts(message, counts, threshold=0):
+    print(message)
+    counts = {key: count for key, count in counts.items() if count >= threshold}
+    if not counts:
+        print("  -")
+    for key, count in sorted(counts.items(), key=lambda x: x[1], reverse=True):
+        print(f"  {key}: {count}")
+
+
+def scan_reports(
+    archive_files, watched_ips, processes, max_keys=None, checkpoint_dir=None
+):
+    extractors = {
+        "ips": extract_ip,
+        "user_agents": extract_user_agent,
+        "status": extract_status,
+    }
+    if watched_ips:
+        extractors["paths"] = partial(extract_paths_for_ips, frozenset(watched_ips))
+    counter_factories = {}
+    if max_keys:
+        counter_factories["ips"] = partial(SpaceSaving, max_keys)
+        counter_factories["user_agents"] = partial(SpaceSaving, max_keys)
+    counts = scan_archives(
+        archive_files,
+        extractors,
+        processes=processes,
+        counter_factories=counter_factories,
+        checkpoint_dir=checkpoint_dir,
+    )
+
+    paths = {ip: {} for ip in watched_ips}
+    for (ip, path), count in counts.pop("paths", {}).items():
+        paths[ip][path] = count
+
+    return counts, paths
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "log_path",
+        help="Path to folder with log file (.json Heroku format)",
+    )
+    parser.add_argument(
+        "--ip",
+        required=False,
+        action="append",
+        default=[],
+        dest="watched_ips",
+        help="IP to extract paths for (can be repeated)",
+    )
+    parser.add_argument(
+        "--threshold",
+        required=False,
+        default=1000,
+        help="Threshold under which IPs and user agents are ignored",
+    )
+    parser.add_argument(
+        "--processes",
+        required=False,
+        type=int,
+        default=None,
+        help="Number of processes used to read archives (default: number of CPUs)",
+    )
+    add_checkpoint_argument(parser)
+    parser.add_argument(
+        "--index",
+        required=False,
+        help="Path to index file, created or updated with new archives if needed",
+    )
+    parser.add_argument(
+        "--max-keys",
+        required=False,
+        type=int,
+        default=None,
+        help="Approximate counts keeping at most this number of IPs and user agents in memory",
+    )
+    args = parser.parse_args()
+    log_path = args.log_path
+    threshold = int(args.threshold)
+    if args.index and (args.checkpoint or args.max_keys):
+        sys.exit("--checkpoint and --max-keys can't be used with --index.")
+
+    archive_files = find_archive_files(log_path)
+    if not archive_files:
+        sys.exit(f"File {log_path} doesn't include any log file.")
+    else:
+        print(f"Found {len(archive_files)} log files.")
+
+    if args.index:
+        connection = open_index(args.index)
+        ingest(connection, archive_files, args.processes)
+        ids = archive_ids(connection, archive_files)
+        counts = {
+            "ips": count_ips(connection, ids),
+            "user_agents": count_user_agents(connection, ids),
+            "status": count_status(connection, ids),
+        }
+        paths = {ip: count_paths_for_ip(connection, ids, ip) for ip in args.watched_ips}
+    else:
+        counts, paths = scan_reports(
+            archive_files,
+            args.watched_ips,
+            args.processes,
+            args.max_keys,
+            args.checkpoint,
+        )
+        if args.max_keys:
+            print(
+                "Approximate counts, overestimated by at most "
+                f"{counts['ips'].max_error()} for IPs and "
+                f"{counts['user_agents'].max_error()} for user agents."
+            )
+
+    print_counts("\nIPs with high activity:", counts["ips"], threshold)
+    for ip in args.watched_ips:
+        print_counts(f"\nPaths requested by {ip}:", paths[ip])
+    print_counts("\nUser agents with high activity:", counts["user_agents"], threshold)
+    print_counts("\nStatus codes:", counts["status"])
+
+
+if __name__ == "__main__":
+    main()
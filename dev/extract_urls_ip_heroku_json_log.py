@@ -1,30 +1,43 @@
 """
-This script can be used to extract the number of requests for IPs from
+This script can be used to extract the paths requested by the specified IP from
 Papertrail's archives in JSON (or native json.gz) format.
 
+With `--group`, paths are grouped by Pontoon endpoint (e.g. all translate views
+as /<locale>/<project>/<resource>/), see path_normalizer.py.
+
+With `--since` and `--until`, only requests in that time range are counted.
+Combined with `--index`, only the chunks of archives overlapping the time range
+are read.
+
 Usage:
-    python extract_ip_heroku_json_log.py ~/path_to_logs
+    python extract_urls_ip_heroku_json_log.py --ip 192.168.0.1 ~/path_to_logs
+    python extract_urls_ip_heroku_json_log.py --group --ip 192.168.0.1 ~/path_to_logs
+    python extract_urls_ip_heroku_json_log.py --ip 192.168.0.1 --index index.sqlite3 \
+        --since 2024-05-01T10:00 --until 2024-05-01T10:20 ~/path_to_logs
 """
 
+from functools import partial
+from heroku_json_log import (
+    add_checkpoint_argument,
+    extract_endpoint_for_ip,
+    extract_in_window,
+    extract_path_for_ip,
+    find_archive_files,
+    parse_time,
+    scan_archives,
+)
+from heroku_log_index import (
+    archive_ids,
+    count_paths_for_ip,
+    ingest,
+    open_index,
+    window_spans,
+)
+from path_normalizer import PathNormalizer, group_counts
 import argparse
-import json
-import glob
-import gzip
-import os
 import sys
 
 
-def iter_log_lines(fp):
-    if fp.endswith(".gz"):
-        with gzip.open(fp, "rt", errors="ignore") as f:
-            for line in f:
-                yield line
-    else:
-        with open(fp, "rt", errors="ignore") as f:
-            for line in f:
-                yield line
-
-
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument(
@@ -36,37 +49,82 @@ def main():
         required=True,
         help="IP to analyze",
     )
+    parser.add_argument(
+        "--group",
+        required=False,
+        action="store_true",
+        default=False,
+        help="Group paths by Pontoon endpoint",
+    )
+    parser.add_argument(
+        "--since",
+        required=False,
+        help="Only count requests from this time (ISO format, UTC by default)",
+    )
+    parser.add_argument(
+        "--until",
+        required=False,
+        help="Only count requests before this time (ISO format, UTC by default)",
+    )
+    parser.add_argument(
+        "--processes",
+        required=False,
+        type=int,
+        default=None,
+        help="Number of processes used to read archives (default: number of CPUs)",
+    )
+    add_checkpoint_argument(parser)
+    parser.add_argument(
+        "--index",
+        required=False,
+        help="Path to index file, created or updated with new archives if needed",
+    )
     args = parser.parse_args()
     log_path = args.log_path
+    if args.index and args.checkpoint:
+        sys.exit("--checkpoint can't be used with --index.")
 
-    archive_files = glob.glob(os.path.join(log_path, "*.json")) + glob.glob(
-        os.path.join(log_path, "*.json.gz")
-    )
+    archive_files = find_archive_files(log_path)
     if not archive_files:
         sys.exit(f"File {log_path} doesn't include any log file.")
     else:
         print(f"Found {len(archive_files)} log files.")
 
-    urls = {}
-    for archive_file in archive_files:
-        for line in iter_log_lines(archive_file):
-            json_line = json.loads(line)
-            ip = json_line.get("heroku", {}).get("fwd", "")
-            if ip:
-                num_ips = len(ip.split(","))
-                if num_ips > 1:
-                    ip = (
-                        ip.split(",")[0].strip()
-                        if num_ips == 2
-                        else ip.split(",")[1].strip()
-                    )
+    if args.group:
+        normalize = PathNormalizer()
+        extractor = partial(extract_endpoint_for_ip, args.ip, normalize)
+    else:
+        extractor = partial(extract_path_for_ip, args.ip)
+
+    windowed = args.since or args.until
+    if windowed:
+        since = parse_time(args.since) if args.since else None
+        until = parse_time(args.until) if args.until else None
+        if (args.since and since is None) or (args.until and until is None):
+            sys.exit("--since and --until must be ISO 8601 dates.")
+        extractor = partial(extract_in_window, since, until, extractor)
 
-                if ip != args.ip:
-                    continue
+    if args.index:
+        connection = open_index(args.index)
+        ingest(connection, archive_files, args.processes)
 
-                url = json_line.get("heroku", {}).get("path", "")
-                if url:
-                    urls[url] = urls.get(url, 0) + 1
+    if args.index and not windowed:
+        urls = count_paths_for_ip(
+            connection, archive_ids(connection, archive_files), args.ip
+        )
+        if args.group:
+            urls = group_counts(urls, normalize)
+    else:
+        if args.index:
+            # Only read the chunks of archives overlapping the time range
+            archive_files = window_spans(connection, archive_files, since, until)
+        urls = scan_archives(
+            archive_files,
+            {"urls": extractor},
+            processes=args.processes,
+            checkpoint_dir=args.checkpoint,
+            needles=[args.ip.encode()],
+        )["urls"]
 
     urls = dict(sorted(urls.items(), key=lambda x: x[1], reverse=True))
 
@@ -2,29 +2,26 @@
 This script can be used to extract the number of requests for user agents from
 Papertrail's archives in JSON (or native json.gz) format.
 
+With `--max-keys`, only the given number of user agents is kept in memory and
+counts are approximate (see heavy_hitters.py).
+
 Usage:
-    python extract_ip_heroku_json_log.py ~/path_to_logs
+    python extract_useragent_heroku_json_log.py ~/path_to_logs
 """
 
+from functools import partial
+from heavy_hitters import SpaceSaving
+from heroku_json_log import (
+    add_checkpoint_argument,
+    extract_user_agent,
+    find_archive_files,
+    scan_archives,
+)
+from heroku_log_index import archive_ids, count_user_agents, ingest, open_index
 import argparse
-import json
-import glob
-import gzip
-import os
 import sys
 
 
-def iter_log_lines(fp):
-    if fp.endswith(".gz"):
-        with gzip.open(fp, "rt", errors="ignore") as f:
-            for line in f:
-                yield line
-    else:
-        with open(fp, "rt", errors="ignore") as f:
-            for line in f:
-                yield line
-
-
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument(
@@ -37,34 +34,56 @@ def main():
         default=1000,
         help="Threshold under which IPs are ignored",
     )
+    parser.add_argument(
+        "--processes",
+        required=False,
+        type=int,
+        default=None,
+        help="Number of processes used to read archives (default: number of CPUs)",
+    )
+    add_checkpoint_argument(parser)
+    parser.add_argument(
+        "--index",
+        required=False,
+        help="Path to index file, created or updated with new archives if needed",
+    )
+    parser.add_argument(
+        "--max-keys",
+        required=False,
+        type=int,
+        default=None,
+        help="Approximate counts keeping at most this number of user agents in memory",
+    )
     args = parser.parse_args()
     log_path = args.log_path
+    if args.index and (args.checkpoint or args.max_keys):
+        sys.exit("--checkpoint and --max-keys can't be used with --index.")
 
-    archive_files = glob.glob(os.path.join(log_path, "*.json")) + glob.glob(
-        os.path.join(log_path, "*.json.gz")
-    )
+    archive_files = find_archive_files(log_path)
     if not archive_files:
         sys.exit(f"File {log_path} doesn't include any log file.")
     else:
         print(f"Found {len(archive_files)} log files.")
 
-    ip_stats = {}
-    for archive_file in archive_files:
-        for line in iter_log_lines(archive_file):
-            json_line = json.loads(line)
-            ip = json_line.get("apache", {}).get("userAgent", "")
-            if ip:
-                num_ips = len(ip.split(","))
-                if num_ips > 1:
-                    ip = (
-                        ip.split(",")[0].strip()
-                        if num_ips == 2
-                        else ip.split(",")[1].strip()
-                    )
-                if ip not in ip_stats:
-                    ip_stats[ip] = 1
-                else:
-                    ip_stats[ip] += 1
+    if args.index:
+        connection = open_index(args.index)
+        ingest(connection, archive_files, args.processes)
+        ip_stats = count_user_agents(connection, archive_ids(connection, archive_files))
+    else:
+        counter_factories = {}
+        if args.max_keys:
+            counter_factories["user_agents"] = partial(SpaceSaving, args.max_keys)
+        ip_stats = scan_archives(
+            archive_files,
+            {"user_agents": extract_user_agent},
+            processes=args.processes,
+            checkpoint_dir=args.checkpoint,
+            counter_factories=counter_factories,
+        )["user_agents"]
+        if args.max_keys:
+            print(
+                f"Approximate counts, overestimated by at most {ip_stats.max_error()}."
+            )
 
     ip_stats = {
         ip: count for ip, count in ip_stats.items() if count >= int(args.threshold)
@@ -0,0 +1,265 @@
+"""
+This script can be used to generate synthetic Heroku logs, to test and
+benchmark the other scripts without downloading real logs:
+- `text`: router log as saved with `heroku logs --tail` (router.log), with some
+  lines from other sources in between
+- `json` and `json.gz`: Papertrail's archives (json/ and json.gz/ folders)
+
+IPs follow a Zipf distribution: IP number n (see generated_ip()) is requested
+with a weight of 1 / n^skew, so generated_ip(0) is always the most active IP.
+Paths, user agents and status codes are drawn from fixed lists with weights
+close to Pontoon's traffic. Output is identical for the same seed.
+
+Usage:
+    python generate_heroku_logs.py ~/synthetic_logs
+    python generate_heroku_logs.py --lines 10000000 --ips 50000 --skew 1.2 --format json.gz ~/synthetic_logs
+"""
+
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate
+import argparse
+import gzip
+import os
+import random
+
+FORMATS = ["text", "json", "json.gz"]
+
+PATHS = [
+    ("/", 10),
+    ("/translate/", 5),
+    ("/{locale}/", 5),
+    ("/{locale}/firefox/", 10),
+    ("/{locale}/firefox/all-resources/?string={id}", 30),
+    ("/{locale}/firefox/browser/browser/browser.ftl/", 10),
+    ("/{locale}/ajax/", 3),
+    ("/projects/firefox/", 3),
+    ("/contributors/{id}/", 2),
+    ("/api/v2/locales/", 2),
+    ("/api/v2/projects/firefox/", 2),
+    ("/graphql", 3),
+    ("/static/js/app.{id}.js", 15),
+]
+LOCALES = ["de", "fr", "it", "es-ES", "pt-BR", "zh-TW", "ja", "sl", "hy-AM"]
+USER_AGENTS = [
+    ("Mozilla/5.0 (X11; Linux x86_64; rv:128.0) Gecko/20100101 Firefox/128.0", 60),
+    ("Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:128.0) Firefox/128.0", 25),
+    ("python-requests/2.31.0", 5),
+    ("curl/8.4.0", 3),
+    ("Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)", 7),
+]
+STATUS = [(200, 85), (302, 4), (304, 5), (404, 4), (500, 1), (503, 1)]
+OTHER_LINES = [
+    'app[web.1]: [INFO] "GET /translate/ HTTP/1.1" 200',
+    "heroku[web.1]: source=web.1 dyno=heroku.123 sample#memory_total=512.00MB",
+    "app[worker.1]: [INFO] Task pontoon.sync.tasks.sync_project succeeded",
+]
+
+
+def generated_ip(index):
+    """Return the IP with rank `index` (0 is the most active)."""
+
+    return f"10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}"
+
+
+class RecordGenerator:
+    def __init__(self, num_ips, skew, seed):
+        self.random = random.Random(seed)
+        self.ips = [generated_ip(index) for index in range(num_ips)]
+        self.ip_weights = list(
+            accumulate(1 / (index + 1) ** skew for index in range(num_ips))
+        )
+        self.path_weights = list(accumulate(weight for _, weight in PATHS))
+        self.user_agent_weights = list(accumulate(w for _, w in USER_AGENTS))
+        self.status_weights = list(accumulate(weight for _, weight in STATUS))
+
+    def records(self, count, start, duration):
+        """Yield `count` records evenly spread over `duration` seconds."""
+
+        choices = self.random.choices
+        # random() is much faster than randint()
+        rand = self.random.random
+        ips = choices(self.ips, cum_weights=self.ip_weights, k=count)
+        paths = choices(PATHS, cum_weights=self.path_weights, k=count)
+        user_agents = choices(USER_AGENTS, cum_weights=self.user_agent_weights, k=count)
+        status = choices(STATUS, cum_weights=self.status_weights, k=count)
+        for index in range(count):
+            path = paths[index][0]
+            if "{" in path:
+                path = path.format(
+                    locale=LOCALES[int(rand() * len(LOCALES))],
+                    id=int(rand() * 100000) + 1,
+                )
+            # 1% of slow requests
+            slow = rand() < 0.01
+            yield {
+                "time": start + timedelta(seconds=duration * index / count),
+                "ip": ips[index],
+                "path": path,
+                "user_agent": user_agents[index][0],
+                "status": status[index][0],
+                "service": int(rand() * (30000 if slow else 500)) + 1,
+                "bytes": int(rand() * 50000) + 200,
+            }
+
+
+def router_line(record):
+    return (
+        f"{record['time'].isoformat()} heroku[router]: at=info method=GET "
+        f"path=\"{record['path']}\" host=pontoon.mozilla.org "
+        f"request_id=00000000-0000-0000-0000-000000000000 fwd=\"{record['ip']}\" "
+        f"dyno=web.1 connect=0ms service={record['service']}ms "
+        f"status={record['status']} bytes={record['bytes']} protocol=https\n"
+    )
+
+
+def json_line(record):
+    # Generated values don't need escaping, formatting is much faster than
+    # json.dumps()
+    return (
+        f'{{"dt": "{record["time"].isoformat().replace("+00:00", "Z")}", '
+        f'"message": "at=info method=GET path=\\"{record["path"]}\\" '
+        f'host=pontoon.mozilla.org fwd=\\"{record["ip"]}\\" dyno=web.1 '
+        f'connect=0ms service={record["service"]}ms status={record["status"]} '
+        f'bytes={record["bytes"]} protocol=https", '
+        f'"heroku": {{"fwd": "{record["ip"]}", "method": "GET", '
+        f'"path": "{record["path"]}", "status": {record["status"]}, '
+        f'"connect": 0, "service": {record["service"]}, '
+        f'"bytes": {record["bytes"]}}}, '
+        f'"apache": {{"userAgent": "{record["user_agent"]}"}}}}\n'
+    )
+
+
+def generate(
+    output_path,
+    num_lines,
+    num_ips=10000,
+    skew=1.1,
+    formats=("text", "json.gz"),
+    num_files=4,
+    seed=0,
+    start=datetime(2024, 5, 1, tzinfo=timezone.utc),
+):
+    """
+    Write `num_lines` lines in each format, split across `num_files` archives
+    of one hour each for JSON formats. Return the list of paths written.
+    """
+
+    written = []
+    for output_format in formats:
+        generator = RecordGenerator(num_ips, skew, seed)
+        if output_format == "text":
+            files = [(os.path.join(output_path, "router.log"), num_lines)]
+        else:
+            folder = os.path.join(output_path, output_format)
+            os.makedirs(folder, exist_ok=True)
+            files = [
+                (
+                    os.path.join(
+                        folder,
+                        f"{(start + timedelta(hours=i)):%Y-%m-%d-%H}.{output_format}",
+                    ),
+                    num_lines // num_files + (i < num_lines % num_files),
+                )
+                for i in range(num_files)
+            ]
+
+        os.makedirs(output_path, exist_ok=True)
+        for index, (fp, count) in enumerate(files):
+            file_start = start + timedelta(hours=index)
+            if fp.endswith(".gz"):
+                # Default level of gzip, level 9 is much slower
+                f = gzip.open(fp, "wt", compresslevel=6)
+            else:
+                f = open(fp, "w")
+            with f:
+                # Generate in batches to limit memory with large files
+                for offset in range(0, count, 100000):
+                    batch = min(100000, count - offset)
+                    batch_start = file_start + timedelta(seconds=3600 * offset / count)
+                    duration = 3600 * batch / count
+                    records = generator.records(batch, batch_start, duration)
+                    if output_format != "text":
+                        f.writelines(map(json_line, records))
+                        continue
+                    lines = []
+                    for record in records:
+                        # About 1 line in 10 from other sources
+                        if generator.random.random() < 0.1:
+                            lines.append(
+                                f"{record['time'].isoformat()} "
+                                f"{generator.random.choice(OTHER_LINES)}\n"
+                            )
+                        else:
+                            lines.append(router_line(record))
+                    f.writelines(lines)
+            written.append(fp)
+
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "output_path",
+        help="Path to folder where logs are generated",
+    )
+    parser.add_argument(
+        "--lines",
+        required=False,
+        type=int,
+        default=100000,
+        help="Number of lines to generate for each format",
+    )
+    parser.add_argument(
+        "--ips",
+        required=False,
+        type=int,
+        default=10000,
+        help="Number of distinct IPs",
+    )
+    parser.add_argument(
+        "--skew",
+        required=False,
+        type=float,
+        default=1.1,
+        help="Exponent of the Zipf distribution of IPs (0 for uniform)",
+    )
+    parser.add_argument(
+        "--format",
+        required=False,
+        action="append",
+        choices=FORMATS,
+        dest="formats",
+        help="Format to generate (can be repeated, default: text and json.gz)",
+    )
+    parser.add_argument(
+        "--files",
+        required=False,
+        type=int,
+        default=4,
+        help="Number of archives for JSON formats",
+    )
+    parser.add_argument(
+        "--seed",
+        required=False,
+        type=int,
+        default=0,
+        help="Seed of the random generator",
+    )
+    args = parser.parse_args()
+
+    written = generate(
+        args.output_path,
+        args.lines,
+        args.ips,
+        args.skew,
+        args.formats or ["text", "json.gz"],
+        args.files,
+        args.seed,
+    )
+    for fp in written:
+        print(f"Generated {fp}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Approximate counting of the most frequent keys in bounded memory.
+
+SpaceSaving implements the Space-Saving algorithm (Metwally et al.): at most
+`capacity` keys are tracked, when a new key arrives and the summary is full it
+replaces the key with the lowest count, inheriting that count. Counts are never
+underestimated, and overestimated by at most total / capacity, so every key
+seen more than that many times is guaranteed to be in the summary.
+
+It can be used in place of a Counter in heroku_json_log.scan_archives():
+`summary[key] += 1` counts a key, `summary.update(other)` merges the summaries
+computed by different processes.
+
+Usage:
+    from heavy_hitters import SpaceSaving
+
+    summary = SpaceSaving(10000)
+    for ip in ips:
+        summary[ip] += 1
+    print(summary.most_common(10), summary.max_error())
+"""
+
+
+class SpaceSaving:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.total = 0
+        self.counts = {}
+        self.errors = {}
+        # Keys grouped by count, to find the key with the lowest count in
+        # constant time. Dictionaries are used as ordered sets.
+        self.buckets = {}
+        self.min_count = 0
+
+    def __len__(self):
+        return len(self.counts)
+
+    def __contains__(self, key):
+        return key in self.counts
+
+    def __getitem__(self, key):
+        return self.counts.get(key, 0)
+
+    def __setitem__(self, key, value):
+        # Only increments are supported, i.e. summary[key] += n
+        self.add(key, value - self[key])
+
+    def floor(self):
+        """Count assigned to keys that are not in the summary."""
+
+        return self.min_count if len(self.counts) >= self.capacity else 0
+
+    def max_error(self):
+        """Maximum overestimation of the counts in the summary."""
+
+        return max(self.errors.values(), default=0)
+
+    def add(self, key, n=1):
+        self.total += n
+
+        if key in self.counts:
+            count = self.counts[key]
+            self.remove_from_bucket(key, count)
+        elif len(self.counts) < self.capacity:
+            count = 0
+            self.errors[key] = 0
+        else:
+            # Replace the key with the lowest count
+            count = self.min_count
+            evicted = next(iter(self.buckets[count]))
+            self.remove_from_bucket(evicted, count)
+            del self.counts[evicted]
+            del self.errors[evicted]
+            self.errors[key] = count
+
+        count += n
+        self.counts[key] = count
+        self.buckets.setdefault(count, {})[key] = None
+
+        if self.min_count not in self.buckets:
+            # With increments of 1, the next lowest count is the new one
+            self.min_count = count if n == 1 else min(self.buckets)
+        elif count < self.min_count:
+            self.min_count = count
+
+    def remove_from_bucket(self, key, count):
+        bucket = self.buckets[count]
+        del bucket[key]
+        if not bucket:
+            del self.buckets[count]
+
+    def update(self, other):
+        """Count keys from an iterable or a mapping, or merge a summary."""
+
+        if not isinstance(other, SpaceSaving):
+            items = (
+                other.items() if hasattr(other, "items") else ((k, 1) for k in other)
+            )
+            for key, count in items:
+                self.add(key, count)
+            return
+
+        # Keys missing from a full summary may have been seen up to its lowest
+        # count, so it's added to both the count and the error bound
+        self_floor = self.floor()
+        other_floor = other.floor()
+        merged = []
+        for key in {**self.counts, **other.counts}:
+            merged.append(
+                (
+                    self.counts.get(key, self_floor)
+                    + other.counts.get(key, other_floor),
+                    self.errors.get(key, self_floor)
+                    + other.errors.get(key, other_floor),
+                    key,
+                )
+            )
+        merged.sort(key=lambda item: item[0], reverse=True)
+
+        total = self.total + other.total
+        self.__init__(self.capacity)
+        self.total = total
+        for count, error, key in merged[: self.capacity]:
+            self.counts[key] = count
+            self.errors[key] = error
+            self.buckets.setdefault(count, {})[key] = None
+        if self.buckets:
+            self.min_count = min(self.buckets)
+
+    def items(self):
+        return self.counts.items()
+
+    def most_common(self, n=None):
+        items = sorted(self.counts.items(), key=lambda item: item[1], reverse=True)
+
+        return items if n is None else items[:n]
@@ -0,0 +1,431 @@
+"""
+Shared helpers for the scripts reading Papertrail's archives in JSON (or native
+json.gz) format.
+
+Archives are split across a pool of processes: each worker counts the keys
+returned by the extractors for a single archive, then the counters are merged
+in the same order as the list of archives, so the output is identical to a
+serial run.
+
+Archives are found in subfolders too (e.g. date-partitioned folders), and can
+be compressed with gzip, bzip2, xz or zstd (see archive_chunks.open_archive()).
+They are decompressed in large blocks, then split into lines.
+
+Lines are read as bytes and can be discarded with a substring check before
+being parsed. orjson is used to parse lines when installed (`pip install
+orjson`), falling back to the json module otherwise.
+
+With a checkpoint directory, the result for each archive is saved as soon as
+it's computed, and reused by later runs with the same extractors as long as
+the size and modification time of the archive don't change. Interrupted runs
+resume from the last archive, and runs over a growing folder only read new
+archives.
+
+Usage:
+    from heroku_json_log import extract_ip, find_archive_files, scan_archives
+
+    counts = scan_archives(find_archive_files(log_path), {"ips": extract_ip})
+"""
+
+from archive_chunks import ArchiveSpan, iter_lines, iter_span_lines, open_archive
+from collections import Counter
+from datetime import datetime, timezone
+from functools import partial
+from hashlib import sha1
+from multiprocessing import Pool
+import glob
+import os
+import pickle
+import re
+
+try:
+    from orjson import loads
+except ImportError:
+    from json import loads
+
+ARCHIVE_EXTENSIONS = [".json", ".json.gz", ".json.bz2", ".json.xz", ".json.zst"]
+
+# Fields storing the time of the log line, depending on the archive format
+TIME_FIELDS = ["dt", "timestamp", "received_at", "generated_at"]
+
+# Numeric times above this value are in milliseconds (or smaller units)
+MAX_TIMESTAMP = 1e11
+
+# Part of the key of checkpoints: increase it when parsing or the results of
+# workers change, so that previous checkpoints are not reused
+CHECKPOINT_VERSION = 2
+
+
+def parse_time(value):
+    """
+    Return the POSIX timestamp of an ISO 8601 date, UTC if not specified, or
+    None if the date is invalid.
+    """
+
+    try:
+        time = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if time.tzinfo is None:
+        time = time.replace(tzinfo=timezone.utc)
+
+    return time.timestamp()
+
+
+def add_checkpoint_argument(parser):
+    """Add the --checkpoint option to an ArgumentParser."""
+
+    parser.add_argument(
+        "--checkpoint",
+        required=False,
+        help="Path to folder storing the counts of each archive, to skip unchanged "
+        "archives when running again",
+    )
+
+
+def find_archive_files(log_path):
+    """Return archives in `log_path` and its subfolders (e.g. one per day)."""
+
+    archive_files = []
+    for extension in ARCHIVE_EXTENSIONS:
+        archive_files += glob.glob(
+            os.path.join(glob.escape(log_path), "**", f"*{extension}"), recursive=True
+        )
+
+    return archive_files
+
+
+def iter_log_lines(fp):
+    with open_archive(fp) as f:
+        yield from iter_lines(f)
+
+
+def parse_line(line):
+    try:
+        return loads(line)
+    except ValueError:
+        # Drop invalid UTF-8 sequences, like reading the file as text with
+        # errors="ignore"
+        return loads(line.decode("utf-8", errors="ignore"))
+
+
+def forwarded_ip(value):
+    """Return the client IP from a list of forwarded addresses."""
+
+    ips = value.split(",")
+    if len(ips) > 1:
+        return ips[0].strip() if len(ips) == 2 else ips[1].strip()
+
+    return value
+
+
+def extract_ip(record):
+    ip = record.get("heroku", {}).get("fwd", "")
+    if ip:
+        return forwarded_ip(ip)
+
+
+def extract_path_for_ip(ip, record):
+    if extract_ip(record) != ip:
+        return None
+
+    return record.get("heroku", {}).get("path", "")
+
+
+def extract_endpoint_for_ip(ip, normalize, record):
+    path = extract_path_for_ip(ip, record)
+    if path:
+        return normalize(path)
+
+
+def extract_paths_for_ips(ips, record):
+    ip = extract_ip(record)
+    if ip not in ips:
+        return None
+
+    path = record.get("heroku", {}).get("path", "")
+    if path:
+        return (ip, path)
+
+
+def extract_status(record):
+    return record.get("heroku", {}).get("status")
+
+
+def extract_user_agent(record):
+    user_agent = record.get("apache", {}).get("userAgent", "")
+    if user_agent:
+        # User agents are split like forwarded IPs to keep the original output
+        return forwarded_ip(user_agent)
+
+
+def numeric_time(value):
+    """
+    Return the POSIX timestamp of a number of seconds, milliseconds,
+    microseconds or nanoseconds since the epoch.
+    """
+
+    # No log is from after year 5138 (1e11 seconds), larger values use a
+    # smaller unit
+    while abs(value) >= MAX_TIMESTAMP:
+        value /= 1000
+
+    return value
+
+
+def extract_time(record):
+    """
+    Return the time of the log line as a POSIX timestamp, or None if it
+    doesn't have a valid time.
+    """
+
+    for field in TIME_FIELDS:
+        value = record.get(field)
+        if not value or isinstance(value, bool):
+            continue
+        if isinstance(value, (int, float)):
+            return numeric_time(value)
+        if isinstance(value, str):
+            return parse_time(value)
+
+        return None
+
+
+def extract_in_window(since, until, extractor, record):
+    """Call `extractor` only for lines logged between `since` and `until`."""
+
+    timestamp = extract_time(record)
+    if timestamp is None:
+        return None
+    if since is not None and timestamp < since:
+        return None
+    if until is not None and timestamp >= until:
+        return None
+
+    return extractor(record)
+
+
+def extract_request_time(record):
+    timestamp = extract_time(record)
+    if timestamp is not None:
+        return ("All requests", timestamp)
+
+
+def extract_ip_time(ips, record):
+    ip = extract_ip(record)
+    if ip not in ips:
+        return None
+
+    timestamp = extract_time(record)
+    if timestamp is not None:
+        return (ip, timestamp)
+
+
+def extract_request(record):
+    """Return the fields stored in the archive index for each request."""
+
+    heroku = record.get("heroku", {})
+    return (
+        extract_ip(record) or "",
+        heroku.get("path", "") or "",
+        extract_user_agent(record) or "",
+        heroku.get("status"),
+    )
+
+
+def new_counters(extractors, counter_factories=None):
+    counter_factories = counter_factories or {}
+
+    return {name: counter_factories.get(name, Counter)() for name in extractors}
+
+
+def count_lines(lines, extractors, needles=None, counter_factories=None):
+    """
+    Count the keys returned by each extractor for lines (as bytes).
+
+    If `needles` is set, lines not including any of them are ignored without
+    being parsed.
+    """
+
+    counts = new_counters(extractors, counter_factories)
+    if needles:
+        lines = filter(re.compile(b"|".join(map(re.escape, needles))).search, lines)
+    for line in lines:
+        record = parse_line(line)
+        for name, extractor in extractors.items():
+            key = extractor(record)
+            if key:
+                counts[name][key] += 1
+
+    return counts
+
+
+def count_archive(archive_file, extractors, needles=None, counter_factories=None):
+    if isinstance(archive_file, ArchiveSpan):
+        lines = iter_span_lines(archive_file)
+    else:
+        lines = iter_log_lines(archive_file)
+
+    return count_lines(lines, extractors, needles, counter_factories)
+
+
+def merge_counts(totals, counts):
+    for name, counter in counts.items():
+        totals[name].update(counter)
+
+
+def stable_key(obj):
+    """
+    Return a representation of a worker and its arguments that doesn't change
+    across runs, unlike pickles of sets (ordered by randomized string hashes)
+    or default reprs (including memory addresses).
+    """
+
+    if isinstance(obj, (str, bytes, int, float, bool, type(None))):
+        return obj
+    if isinstance(obj, partial):
+        return (stable_key(obj.func), stable_key(obj.args), stable_key(obj.keywords))
+    if isinstance(obj, (set, frozenset)):
+        return ("set", tuple(sorted(map(stable_key, obj), key=repr)))
+    if isinstance(obj, dict):
+        return ("dict", tuple((stable_key(k), stable_key(v)) for k, v in obj.items()))
+    if isinstance(obj, (list, tuple)):
+        return tuple(map(stable_key, obj))
+    if hasattr(obj, "__qualname__"):
+        # Functions and classes
+        return f"{obj.__module__}.{obj.__qualname__}"
+
+    return stable_key(obj.__reduce_ex__(pickle.HIGHEST_PROTOCOL))
+
+
+def checkpoint_file(checkpoint_dir, archive_file):
+    """Return the path of the checkpoint of an archive (or ArchiveSpan)."""
+
+    key = repr(tuple(archive_file)) if isinstance(archive_file, ArchiveSpan) else None
+    path = archive_file.path if key else archive_file
+    name = sha1(f"{os.path.abspath(path)}:{key}".encode()).hexdigest()
+
+    return os.path.join(checkpoint_dir, f"{name}.pickle")
+
+
+def run_checkpointed(worker, checkpoint_dir, archive_file):
+    """
+    Return worker(archive_file), loaded from `checkpoint_dir` if the archive
+    didn't change since it was saved.
+    """
+
+    path = archive_file.path if isinstance(archive_file, ArchiveSpan) else archive_file
+    stat = os.stat(path)
+    version = (stat.st_size, stat.st_mtime_ns)
+    fp = checkpoint_file(checkpoint_dir, archive_file)
+    try:
+        with open(fp, "rb") as f:
+            saved_version, result = pickle.load(f)
+        if saved_version == version:
+            return result
+    except (OSError, EOFError, pickle.UnpicklingError):
+        pass
+
+    result = worker(archive_file)
+    # Write to a temporary file first, to never leave a partial checkpoint
+    with open(f"{fp}.{os.getpid()}.tmp", "wb") as f:
+        pickle.dump((version, result), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(f"{fp}.{os.getpid()}.tmp", fp)
+
+    return result
+
+
+def map_archives(worker, archive_files, processes=None, checkpoint_dir=None):
+    """
+    Yield (archive_file, worker(archive_file)) using a pool of processes.
+
+    If `checkpoint_dir` is set, results are saved in a subfolder specific to
+    the worker (including its arguments) and CHECKPOINT_VERSION, and reused for
+    unchanged archives.
+    """
+
+    if checkpoint_dir:
+        key = repr((CHECKPOINT_VERSION, stable_key(worker)))
+        checkpoint_dir = os.path.join(
+            checkpoint_dir, sha1(key.encode()).hexdigest()[:16]
+        )
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        worker = partial(run_checkpointed, worker, checkpoint_dir)
+
+    if processes == 1 or len(archive_files) < 2:
+        yield from zip(archive_files, map(worker, archive_files))
+        return
+
+    with Pool(processes) as pool:
+        # imap() preserves the order of the archives, so that keys with the
+        # same count are listed in the same order as a serial run
+        yield from zip(archive_files, pool.imap(worker, archive_files))
+
+
+def iter_archive_counts(
+    archive_files,
+    extractors,
+    processes=None,
+    needles=None,
+    counter_factories=None,
+    checkpoint_dir=None,
+):
+    """
+    Yield (archive_file, counts) for each archive, in the order of the list.
+
+    See scan_archives() for the arguments.
+    """
+
+    worker = partial(
+        count_archive,
+        extractors=extractors,
+        needles=needles,
+        counter_factories=counter_factories,
+    )
+
+    yield from map_archives(worker, archive_files, processes, checkpoint_dir)
+
+
+def scan_archives(
+    archive_files,
+    extractors,
+    processes=None,
+    needles=None,
+    counter_factories=None,
+    checkpoint_dir=None,
+):
+    """
+    Count the keys returned by each extractor across all archive files.
+
+    Archive files can also be ArchiveSpan objects, to only read part of them.
+
+    `extractors` maps a report name to a function receiving the parsed JSON
+    line and returning the key to count (or None to ignore the line). They
+    need to be picklable, i.e. module level functions or `functools.partial`
+    objects. Returns a dictionary of Counters with the same names.
+
+    `needles` is an optional list of bytes: lines that don't include any of
+    them are skipped before parsing. Use it only if all extractors return None
+    for those lines.
+
+    `counter_factories` optionally maps report names to a function returning
+    the object used instead of a Counter, e.g. `partial(SpaceSaving, 10000)`
+    from heavy_hitters.py. It needs to support `counter[key] += 1` and
+    `total.update(counter)` to merge the counts of different archives.
+
+    `checkpoint_dir` is an optional folder where the counts of each archive
+    are saved, to skip unchanged archives in later runs (see map_archives()).
+    """
+
+    totals = new_counters(extractors, counter_factories)
+    for _, counts in iter_archive_counts(
+        archive_files,
+        extractors,
+        processes,
+        needles,
+        counter_factories,
+        checkpoint_dir,
+    ):
+        merge_counts(totals, counts)
+
+    return totals
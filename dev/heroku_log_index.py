@@ -0,0 +1,333 @@
+"""
+Persistent index of Papertrail's archives, stored in a SQLite database.
+
+Each archive is read once and stored as the number of requests for each
+combination of IP, path, user agent and status code. IPs, paths and user agents
+are dictionary-encoded in separate tables, so the requests table only stores
+integers. Reports are then SQL aggregations over that table, instead of
+another pass over the archives.
+
+Archives are identified by path, size and modification time: ingesting the
+same folder again only reads archives that are new or changed since the last
+run.
+
+Each archive is also split in chunks of a few MB, storing where they start and
+the time range of their lines. Queries on a time range only read the chunks
+overlapping it (see archive_chunks.py).
+
+Counts only include the given archives: several folders can share the same
+index, and reports on one folder don't include requests of the others.
+
+Usage:
+    from heroku_log_index import archive_ids, count_ips, ingest, open_index
+
+    connection = open_index("index.sqlite3")
+    archive_files = find_archive_files(log_path)
+    ingest(connection, archive_files)
+    ip_stats = count_ips(connection, archive_ids(connection, archive_files))
+"""
+
+from archive_chunks import ArchiveSpan, iter_log_chunks
+from collections import Counter
+from heroku_json_log import extract_request, extract_time, map_archives, parse_line
+import os
+import sqlite3
+
+DICTIONARIES = ["ips", "paths", "user_agents"]
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS archives (
+        id INTEGER PRIMARY KEY,
+        path TEXT UNIQUE NOT NULL,
+        size INTEGER NOT NULL,
+        mtime REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS ips (
+        id INTEGER PRIMARY KEY,
+        value TEXT UNIQUE NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS paths (
+        id INTEGER PRIMARY KEY,
+        value TEXT UNIQUE NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS user_agents (
+        id INTEGER PRIMARY KEY,
+        value TEXT UNIQUE NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS requests (
+        archive_id INTEGER NOT NULL,
+        ip_id INTEGER NOT NULL,
+        path_id INTEGER NOT NULL,
+        user_agent_id INTEGER NOT NULL,
+        status,
+        count INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS chunks (
+        archive_id INTEGER NOT NULL,
+        member_offset INTEGER NOT NULL,
+        skip INTEGER NOT NULL,
+        length INTEGER NOT NULL,
+        first_time REAL,
+        last_time REAL
+    );
+    CREATE INDEX IF NOT EXISTS chunks_archive ON chunks (archive_id);
+    CREATE INDEX IF NOT EXISTS requests_archive ON requests (archive_id);
+    CREATE INDEX IF NOT EXISTS requests_ip ON requests (ip_id);
+"""
+
+
+def open_index(index_file):
+    connection = sqlite3.connect(index_file)
+    connection.executescript(SCHEMA)
+
+    return connection
+
+
+def load_dictionary(connection, table):
+    return {
+        value: value_id
+        for value_id, value in connection.execute(f"SELECT id, value FROM {table}")
+    }
+
+
+def encode(connection, table, dictionary, value):
+    if value not in dictionary:
+        cursor = connection.execute(f"INSERT INTO {table} (value) VALUES (?)", (value,))
+        dictionary[value] = cursor.lastrowid
+
+    return dictionary[value]
+
+
+def index_archive(archive_file):
+    """Return the requests counter and the list of chunks of an archive."""
+
+    requests = Counter()
+    chunks = []
+    for span, lines in iter_log_chunks(archive_file):
+        times = []
+        for line in lines:
+            record = parse_line(line)
+            requests[extract_request(record)] += 1
+            timestamp = extract_time(record)
+            if timestamp is not None:
+                times.append(timestamp)
+        chunks.append(
+            (
+                span.member_offset,
+                span.skip,
+                span.length,
+                min(times, default=None),
+                max(times, default=None),
+            )
+        )
+
+    return requests, chunks
+
+
+def delete_archive(connection, path):
+    for table in ["requests", "chunks"]:
+        connection.execute(
+            f"DELETE FROM {table} WHERE archive_id IN "
+            "(SELECT id FROM archives WHERE path = ?)",
+            (path,),
+        )
+    connection.execute("DELETE FROM archives WHERE path = ?", (path,))
+
+
+def ingest(connection, archive_files, processes=None):
+    """
+    Add new or modified archives to the index, and remove archives that don't
+    exist anymore.
+
+    Returns the number of archives read.
+    """
+
+    indexed = {
+        path: (size, mtime)
+        for path, size, mtime in connection.execute(
+            "SELECT path, size, mtime FROM archives"
+        )
+    }
+    with connection:
+        for path in indexed:
+            if not os.path.exists(path):
+                delete_archive(connection, path)
+
+    new_files = []
+    for archive_file in archive_files:
+        archive_file = os.path.abspath(archive_file)
+        stat = os.stat(archive_file)
+        if indexed.get(archive_file) != (stat.st_size, stat.st_mtime):
+            new_files.append(archive_file)
+    if not new_files:
+        return 0
+
+    dictionaries = {table: load_dictionary(connection, table) for table in DICTIONARIES}
+    for archive_file, (requests, chunks) in map_archives(
+        index_archive, new_files, processes
+    ):
+        stat = os.stat(archive_file)
+        with connection:
+            # Remove previous data if the archive changed
+            delete_archive(connection, archive_file)
+            archive_id = connection.execute(
+                "INSERT INTO archives (path, size, mtime) VALUES (?, ?, ?)",
+                (archive_file, stat.st_size, stat.st_mtime),
+            ).lastrowid
+
+            rows = []
+            for (ip, path, user_agent, status), count in requests.items():
+                rows.append(
+                    (
+                        archive_id,
+                        encode(connection, "ips", dictionaries["ips"], ip),
+                        encode(connection, "paths", dictionaries["paths"], path),
+                        encode(
+                            connection,
+                            "user_agents",
+                            dictionaries["user_agents"],
+                            user_agent,
+                        ),
+                        status,
+                        count,
+                    )
+                )
+            connection.executemany(
+                "INSERT INTO requests VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+            connection.executemany(
+                "INSERT INTO chunks VALUES (?, ?, ?, ?, ?, ?)",
+                [(archive_id,) + chunk for chunk in chunks],
+            )
+
+    return len(new_files)
+
+
+def window_spans(connection, archive_files, since=None, until=None):
+    """
+    Return the list of ArchiveSpan to read for lines logged between `since`
+    and `until` (POSIX timestamps), merging consecutive chunks.
+
+    Archives must have been ingested first.
+    """
+
+    since = float("-inf") if since is None else since
+    until = float("inf") if until is None else until
+    spans = []
+    for archive_file in archive_files:
+        archive_file = os.path.abspath(archive_file)
+        chunks = connection.execute(
+            """
+            SELECT member_offset, skip, length, first_time, last_time FROM chunks
+            WHERE archive_id = (SELECT id FROM archives WHERE path = ?)
+            ORDER BY rowid
+            """,
+            (archive_file,),
+        ).fetchall()
+        if not chunks:
+            # Ingested before chunks were stored, read the whole archive
+            spans.append(ArchiveSpan(archive_file, 0, 0, -1))
+            continue
+
+        # Chunks are stored in order and each one starts where the previous
+        # one ends, overlapping chunks that follow each other are merged
+        previous_overlaps = False
+        for member_offset, skip, length, first_time, last_time in chunks:
+            # Chunks without timestamps are always read
+            overlaps = first_time is None or (first_time < until and last_time >= since)
+            if overlaps and previous_overlaps:
+                spans[-1] = spans[-1]._replace(length=spans[-1].length + length)
+            elif overlaps:
+                spans.append(ArchiveSpan(archive_file, member_offset, skip, length))
+            previous_overlaps = overlaps
+
+    return spans
+
+
+def archive_ids(connection, archive_files):
+    """Return the ids of `archive_files` in the index, ignoring missing ones."""
+
+    ids = []
+    for archive_file in archive_files:
+        row = connection.execute(
+            "SELECT id FROM archives WHERE path = ?", (os.path.abspath(archive_file),)
+        ).fetchone()
+        if row is not None:
+            ids.append(row[0])
+
+    return ids
+
+
+def query_counts(connection, query, archive_ids, parameters=()):
+    # Archive ids are stored in a temporary table instead of a list of
+    # parameters, which is limited in size
+    with connection:
+        connection.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS selected_archives (id INTEGER PRIMARY KEY)"
+        )
+        connection.execute("DELETE FROM selected_archives")
+        connection.executemany(
+            "INSERT INTO selected_archives VALUES (?)", [(i,) for i in archive_ids]
+        )
+
+    # Rows are stored in order of first appearance in the logs, ordering ties
+    # by MIN(rowid) returns them in the same order as reading the archives
+    return Counter(dict(connection.execute(query, parameters)))
+
+
+def count_ips(connection, archive_ids):
+    return query_counts(
+        connection,
+        """
+        SELECT ips.value, SUM(count) AS total FROM requests
+        JOIN ips ON ips.id = requests.ip_id
+        WHERE archive_id IN (SELECT id FROM selected_archives) AND ips.value != ''
+        GROUP BY ip_id
+        ORDER BY total DESC, MIN(requests.rowid)
+        """,
+        archive_ids,
+    )
+
+
+def count_paths_for_ip(connection, archive_ids, ip):
+    return query_counts(
+        connection,
+        """
+        SELECT paths.value, SUM(count) AS total FROM requests
+        JOIN paths ON paths.id = requests.path_id
+        WHERE archive_id IN (SELECT id FROM selected_archives)
+            AND ip_id = (SELECT id FROM ips WHERE value = ?) AND paths.value != ''
+        GROUP BY path_id
+        ORDER BY total DESC, MIN(requests.rowid)
+        """,
+        archive_ids,
+        (ip,),
+    )
+
+
+def count_user_agents(connection, archive_ids):
+    return query_counts(
+        connection,
+        """
+        SELECT user_agents.value, SUM(count) AS total FROM requests
+        JOIN user_agents ON user_agents.id = requests.user_agent_id
+        WHERE archive_id IN (SELECT id FROM selected_archives)
+            AND user_agents.value != ''
+        GROUP BY user_agent_id
+        ORDER BY total DESC, MIN(requests.rowid)
+        """,
+        archive_ids,
+    )
+
+
+def count_status(connection, archive_ids):
+    return query_counts(
+        connection,
+        """
+        SELECT status, SUM(count) AS total FROM requests
+        WHERE archive_id IN (SELECT id FROM selected_archives) AND status IS NOT NULL
+        GROUP BY status
+        ORDER BY total DESC, MIN(requests.rowid)
+        """,
+        archive_ids,
+    )
@@ -0,0 +1,53 @@
+"""
+This script can be used to store Papertrail's archives in JSON (or native
+json.gz) format in an index file, so that the extract_*_heroku_json_log.py
+scripts can run their reports with `--index` without reading the archives
+again.
+
+Only archives that are new or changed since the last run are read.
+
+Usage:
+    python ingest_heroku_json_log.py --index index.sqlite3 ~/path_to_logs
+    python extract_ip_heroku_json_log.py --index index.sqlite3 ~/path_to_logs
+"""
+
+from heroku_json_log import find_archive_files
+from heroku_log_index import ingest, open_index
+import argparse
+import sys
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "log_path",
+        help="Path to folder with log file (.json Heroku format)",
+    )
+    parser.add_argument(
+        "--index",
+        required=True,
+        help="Path to index file",
+    )
+    parser.add_argument(
+        "--processes",
+        required=False,
+        type=int,
+        default=None,
+        help="Number of processes used to read archives (default: number of CPUs)",
+    )
+    args = parser.parse_args()
+    log_path = args.log_path
+
+    archive_files = find_archive_files(log_path)
+    if not archive_files:
+        sys.exit(f"File {log_path} doesn't include any log file.")
+    else:
+        print(f"Found {len(archive_files)} log files.")
+
+    connection = open_index(args.index)
+    num_files = ingest(connection, archive_files, args.processes)
+    print(f"Added {num_files} log files to {args.index}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Offline lookup of the autonomous system (ASN) and country of IPs.
+
+Databases are CSV or TSV files (optionally gzip compressed), either:
+- with a header, including a `network` column in CIDR notation (e.g. MaxMind's
+  GeoLite2 ASN CSV), or `range_start` and `range_end` columns, plus ASN,
+  organization and country columns when available (see COLUMNS);
+- without header, in the iptoasn.com format: range start, range end, ASN,
+  country code, AS description (https://iptoasn.com/, ip2asn-combined.tsv.gz).
+
+Ranges are converted into sorted arrays of integers for each IP version, like
+BlockedIPs in blocked_ips.py, so a lookup is a binary search. Results are
+cached per IP, since the same IPs are looked up repeatedly.
+
+Usage:
+    from ip_database import IPDatabase
+
+    database = IPDatabase("ip2asn-combined.tsv.gz")
+    network = database.lookup("192.168.0.1")
+    if network:
+        print(network.asn, network.organization, network.country)
+"""
+
+from bisect import bisect_right
+from collections import namedtuple
+from functools import lru_cache
+from itertools import chain
+from ipaddress import ip_address, ip_network
+import csv
+import gzip
+
+Network = namedtuple("Network", ["asn", "organization", "country"])
+
+# Accepted column names for each field, in lower case
+COLUMNS = {
+    "network": ["network", "prefix", "cidr"],
+    "start": ["range_start", "start", "ip_start", "start_ip"],
+    "end": ["range_end", "end", "ip_end", "end_ip"],
+    "asn": ["autonomous_system_number", "asn", "as_number"],
+    "organization": [
+        "autonomous_system_organization",
+        "organization",
+        "as_description",
+        "as_name",
+    ],
+    "country": ["country_iso_code", "country_code", "country"],
+}
+
+# Column order of files without header (iptoasn.com)
+IPTOASN_COLUMNS = ["start", "end", "asn", "country", "organization"]
+
+
+def find_columns(header):
+    names = [name.strip().lower() for name in header]
+    columns = {}
+    for field, aliases in COLUMNS.items():
+        for alias in aliases:
+            if alias in names:
+                columns[field] = names.index(alias)
+                break
+
+    return columns
+
+
+def parse_asn(value):
+    value = value.strip().upper().removeprefix("AS")
+
+    return int(value) if value.isdigit() else None
+
+
+class IPDatabase:
+    def __init__(self, fp, cache_size=100000):
+        opener = gzip.open if fp.endswith(".gz") else open
+        with opener(fp, "rt", newline="", encoding="utf-8") as f:
+            first_line = f.readline()
+            dialect = "excel-tab" if "\t" in first_line else "excel"
+            rows = csv.reader(f, dialect)
+            header = next(csv.reader([first_line], dialect), [])
+            columns = find_columns(header)
+            if "network" not in columns and "start" not in columns:
+                # No header, the first line is data
+                columns = {field: i for i, field in enumerate(IPTOASN_COLUMNS)}
+                rows = chain([header], rows)
+            ranges = self.read_ranges(rows, columns)
+
+        # Networks are shared by many ranges, store each one once
+        self.networks = []
+        network_ids = {}
+        self.starts = {4: [], 6: []}
+        self.ends = {4: [], 6: []}
+        self.network_ids = {4: [], 6: []}
+        ranges.sort(key=lambda item: item[:2])
+        for version, start, end, network in ranges:
+            if network not in network_ids:
+                network_ids[network] = len(self.networks)
+                self.networks.append(network)
+            self.starts[version].append(start)
+            self.ends[version].append(end)
+            self.network_ids[version].append(network_ids[network])
+
+        self.lookup = lru_cache(maxsize=cache_size)(self.find_network)
+
+    def read_ranges(self, rows, columns):
+        def get(row, field):
+            index = columns.get(field)
+            return row[index].strip() if index is not None and index < len(row) else ""
+
+        ranges = []
+        for row in rows:
+            try:
+                if "network" in columns:
+                    network = ip_network(get(row, "network"), strict=False)
+                    version = network.version
+                    start = int(network.network_address)
+                    end = start + (1 << (network.max_prefixlen - network.prefixlen)) - 1
+                else:
+                    start_ip = ip_address(get(row, "start"))
+                    version = start_ip.version
+                    start = int(start_ip)
+                    end = int(ip_address(get(row, "end")))
+            except ValueError:
+                continue
+
+            asn = parse_asn(get(row, "asn"))
+            organization = get(row, "organization")
+            country = get(row, "country").upper()
+            # Unrouted ranges are stored with ASN 0 in iptoasn.com
+            if (
+                not asn
+                and country in ("", "NONE")
+                and organization in ("", "Not routed")
+            ):
+                continue
+            ranges.append(
+                (
+                    version,
+                    start,
+                    end,
+                    Network(asn, organization or None, country or None),
+                )
+            )
+
+        return ranges
+
+    def __len__(self):
+        return len(self.starts[4]) + len(self.starts[6])
+
+    def find_network(self, ip):
+        """Return the Network of an IP (string), or None if it's not found."""
+
+        try:
+            ip_obj = ip_address(ip)
+        except ValueError:
+            return None
+
+        value = int(ip_obj)
+        version = ip_obj.version
+        index = bisect_right(self.starts[version], value) - 1
+        if index < 0 or value > self.ends[version][index]:
+            return None
+
+        return self.networks[self.network_ids[version][index]]
+
+
+def describe_network(network):
+    """Return a short description, e.g. "AS16509 AMAZON-02, US"."""
+
+    if network is None:
+        return "unknown network"
+
+    parts = [f"AS{network.asn}" if network.asn else "no ASN"]
+    if network.organization:
+        parts[0] += f" {network.organization}"
+    if network.country:
+        parts.append(network.country)
+
+    return ", ".join(parts)
@@ -0,0 +1,133 @@
+"""
+Reading plain-text log captures (e.g. saved with `heroku logs --tail`) through
+memory maps, instead of loading all lines in memory.
+
+Files are mapped read-only, in windows of whole lines (WINDOW_SIZE bytes at
+most, unless a single line is longer), and searched with bytes regular
+expressions: only matched spans are copied and decoded. Each window is
+unmapped before mapping the next one, so memory use doesn't depend on the size
+of the file. Files can also be split into chunks of whole lines, to count
+matches with a pool of processes.
+
+Usage:
+    from mapped_log import count_matches
+
+    counts = count_matches("log.txt", re.compile(rb'fwd="(.*)"'), processes=4)
+"""
+
+from collections import Counter
+from functools import partial
+from multiprocessing import Pool
+import mmap
+import os
+
+WINDOW_SIZE = 64 * 1024 * 1024
+
+# Minimum size of the chunk read by each process when their number is not set
+MIN_CHUNK_SIZE = 16 * 1024 * 1024
+
+
+def iter_windows(fp, start=0, end=None):
+    """
+    Yield (buffer, position, end position) for consecutive windows of whole
+    lines between offsets `start` and `end` of a file (the end by default).
+    Offsets must be at the start of a line.
+    """
+
+    with open(fp, "rb") as f:
+        end = os.fstat(f.fileno()).st_size if end is None else end
+        position = start
+        window_size = WINDOW_SIZE
+        while position < end:
+            # Maps must start at a multiple of the allocation granularity
+            map_start = position - position % mmap.ALLOCATIONGRANULARITY
+            map_end = min(end, map_start + window_size)
+            buffer = mmap.mmap(
+                f.fileno(),
+                map_end - map_start,
+                offset=map_start,
+                access=mmap.ACCESS_READ,
+            )
+            with buffer:
+                window_end = map_end
+                if map_end < end:
+                    line_end = buffer.rfind(b"\n", position - map_start)
+                    if line_end == -1:
+                        # Line longer than the window, try again with a larger one
+                        window_size *= 2
+                        continue
+                    window_end = map_start + line_end + 1
+                if hasattr(buffer, "madvise"):
+                    buffer.madvise(mmap.MADV_SEQUENTIAL)
+                yield buffer, position - map_start, window_end - map_start
+            position = window_end
+            window_size = WINDOW_SIZE
+
+
+def line_chunks(fp, count):
+    """Return (start, end) offsets splitting a file in `count` chunks of lines."""
+
+    size = os.path.getsize(fp)
+    offsets = [0]
+    with open(fp, "rb") as f:
+        for index in range(1, count):
+            # Move the boundary after the next line break
+            position = max(size * index // count, offsets[-1])
+            f.seek(position)
+            line = f.readline()
+            offsets.append(min(size, position + len(line)))
+    offsets.append(size)
+
+    return [(start, end) for start, end in zip(offsets, offsets[1:]) if start < end]
+
+
+def count_range(fp, pattern, span):
+    """Count the first group of `pattern` matches in a range of a file, as bytes."""
+
+    counts = Counter()
+    for buffer, position, end in iter_windows(fp, *span):
+        for match in pattern.finditer(buffer, position, end):
+            counts[match.group(1)] += 1
+
+    return counts
+
+
+def count_matches(fp, pattern, processes=None):
+    """
+    Return a Counter of the first group of `pattern` matches in a file, as
+    bytes, in the order of their first match. By default, files are read with
+    one process per CPU, each reading MIN_CHUNK_SIZE bytes at least.
+
+    Patterns are matched against a buffer of multiple lines: use `.` or
+    `[^\\n]` rather than `\\s` or negated classes to avoid matching across
+    lines.
+    """
+
+    if processes is None:
+        chunks = os.path.getsize(fp) // MIN_CHUNK_SIZE + 1
+        processes = min(os.cpu_count() or 1, chunks)
+    spans = line_chunks(fp, processes)
+    if len(spans) < 2:
+        return count_range(fp, pattern, spans[0]) if spans else Counter()
+
+    counts = Counter()
+    with Pool(processes) as pool:
+        # imap() keeps the order of chunks, i.e. the order of first matches
+        for chunk_counts in pool.imap(partial(count_range, fp, pattern), spans):
+            counts.update(chunk_counts)
+
+    return counts
+
+
+def iter_lines_with(fp, needle):
+    """Yield the lines of a file (as bytes, without line break) including `needle`."""
+
+    for buffer, position, end in iter_windows(fp):
+        found = buffer.find(needle, position, end)
+        while found != -1:
+            line_start = buffer.rfind(b"\n", position, found) + 1 or position
+            line_end = buffer.find(b"\n", found, end)
+            if line_end == -1:
+                line_end = end
+            yield buffer[line_start:line_end]
+            found = buffer.find(needle, line_end, end)
@@ -0,0 +1,84 @@
+"""
+Normalization of requested paths into Pontoon endpoint templates, e.g.
+
+/de/firefox/all-resources/?string=12345 -> /<locale>/<project>/<resource>/
+
+Rules are a list of (regular expression, template) pairs: the first expression
+matching the beginning of the path (without query string) is expanded with
+`match.expand(template)`. Paths not matching any rule have numeric segments
+replaced with <id>. Pass different rules to PathNormalizer to group paths of
+another site.
+
+Results are memoized in an LRU cache, since logs repeat the same raw paths.
+
+Usage:
+    from path_normalizer import PathNormalizer
+
+    normalize = PathNormalizer()
+    normalize("/de/firefox/all-resources/?string=12345")
+"""
+
+from collections import Counter
+from functools import lru_cache
+import re
+
+LOCALE = r"[a-z]{2,3}(?:-[A-Za-z0-9]+)*"
+
+# First segments of Pontoon paths that could be mistaken for locale codes
+RESERVED = r"(?!(?:api|faq|sso)/)"
+
+PONTOON_RULES = [
+    (r"/static/", "/static/<file>"),
+    (r"/api/v2/locales/[^/]+/", "/api/v2/locales/<locale>/"),
+    (r"/api/v2/projects/[^/]+/", "/api/v2/projects/<project>/"),
+    (r"/api/v2/([^/]+)/", r"/api/v2/\1/"),
+    (r"/projects/[^/]+/([a-z-]+)/", r"/projects/<project>/\1/"),
+    (r"/projects/[^/]+/", "/projects/<project>/"),
+    (r"/contributors/[^/]+/", "/contributors/<user>/"),
+    (r"/teams/[^/]+/", "/teams/<team>/"),
+    (
+        rf"/{RESERVED}{LOCALE}/(ajax|contributors|insights|info|projects)/",
+        r"/<locale>/\1/",
+    ),
+    (rf"/{RESERVED}{LOCALE}/[^/]+/[^/]+", "/<locale>/<project>/<resource>/"),
+    (rf"/{RESERVED}{LOCALE}/[^/]+/", "/<locale>/<project>/"),
+    (rf"/{RESERVED}{LOCALE}/$", "/<locale>/"),
+]
+
+NUMERIC_SEGMENT = re.compile(r"(?<=/)\d+(?=/|$)")
+
+
+class PathNormalizer:
+    def __init__(self, rules=PONTOON_RULES, cache_size=100000):
+        self.rules = rules
+        self.cache_size = cache_size
+        self.compiled_rules = [
+            (re.compile(pattern), template) for pattern, template in rules
+        ]
+        self.normalize = lru_cache(maxsize=cache_size)(self.normalize_path)
+
+    def __reduce__(self):
+        # The cache can't be pickled, rebuild it when sent to other processes
+        return (PathNormalizer, (self.rules, self.cache_size))
+
+    def __call__(self, path):
+        return self.normalize(path)
+
+    def normalize_path(self, path):
+        path = path.split("?", 1)[0]
+        for pattern, template in self.compiled_rules:
+            match = pattern.match(path)
+            if match:
+                return match.expand(template)
+
+        return NUMERIC_SEGMENT.sub("<id>", path)
+
+
+def group_counts(counts, normalize):
+    """Sum counts of raw paths by endpoint, keeping the order of first appearance."""
+
+    grouped = Counter()
+    for path, count in counts.items():
+        grouped[normalize(path)] += count
+
+    return grouped
@@ -0,0 +1,59 @@
+"""
+Streaming quantile estimation in constant memory.
+
+QuantileSketch stores values in logarithmic buckets (as in DDSketch): each
+bucket covers values within a relative accuracy (1% by default) of each other,
+so the number of buckets only depends on the range of values (e.g. about 500
+for 1 ms to 30 s), not on the number of values.
+
+Usage:
+    from quantile_sketch import QuantileSketch
+
+    sketch = QuantileSketch()
+    for value in values:
+        sketch.add(value)
+    print(sketch.quantile(0.95))
+"""
+
+import math
+
+
+class QuantileSketch:
+    def __init__(self, relative_accuracy=0.01):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets = {}
+        self.zero_count = 0
+        self.count = 0
+        self.total = 0
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        if value <= 0:
+            self.zero_count += 1
+            return
+
+        index = math.ceil(math.log(value) / self.log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+
+    def update(self, other):
+        self.count += other.count
+        self.total += other.total
+        self.zero_count += other.zero_count
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if rank < seen:
+                # Middle of the bucket, within the relative accuracy
+                return 2 * self.gamma**index / (self.gamma + 1)
@@ -0,0 +1,119 @@
+"""
+Number of requests per time bucket, for multiple series (e.g. all requests and
+single IPs).
+
+Each series is stored as blocks of BLOCK_SIZE consecutive buckets (arrays of
+integers), keyed by block index, instead of a dictionary of timestamps. Only
+blocks with requests are stored and written: a few distant times (e.g. a
+wrong timestamp) add a few blocks, not every bucket in between.
+
+It can be used in place of a Counter in heroku_json_log.scan_archives(), with
+(series, timestamp) keys: `histogram[(series, timestamp)] += 1` counts a
+request, `histogram.update(other)` merges histograms from different processes.
+
+Usage:
+    from rate_histogram import RateHistogram
+
+    histogram = RateHistogram(60)
+    histogram[("All requests", 1714521600.5)] += 1
+    for row in histogram.rows():
+        print(row)
+"""
+
+from array import array
+from datetime import datetime, timezone
+
+# Number of buckets in each block (a day of one-minute buckets)
+BLOCK_SIZE = 1440
+
+
+def zeros(length):
+    return array("Q", bytes(8 * length))
+
+
+class RateHistogram:
+    def __init__(self, bucket_size):
+        self.bucket_size = bucket_size
+        # Series name -> {block index: array of counts}
+        self.series = {}
+        # Series name -> [first bucket, last bucket]
+        self.bounds = {}
+
+    def bucket(self, timestamp):
+        return int(timestamp // self.bucket_size)
+
+    def get_counts(self, name, bucket):
+        """Return the block of `bucket` and its offset, adding the block if needed."""
+
+        blocks = self.series.setdefault(name, {})
+        index, offset = divmod(bucket, BLOCK_SIZE)
+        counts = blocks.get(index)
+        if counts is None:
+            counts = blocks[index] = zeros(BLOCK_SIZE)
+        bounds = self.bounds.get(name)
+        if bounds is None:
+            self.bounds[name] = [bucket, bucket]
+        else:
+            bounds[0] = min(bounds[0], bucket)
+            bounds[1] = max(bounds[1], bucket)
+
+        return counts, offset
+
+    def __getitem__(self, key):
+        name, timestamp = key
+        index, offset = divmod(self.bucket(timestamp), BLOCK_SIZE)
+        counts = self.series.get(name, {}).get(index)
+
+        return counts[offset] if counts is not None else 0
+
+    def __setitem__(self, key, value):
+        name, timestamp = key
+        counts, offset = self.get_counts(name, self.bucket(timestamp))
+        counts[offset] = value
+
+    def update(self, other):
+        for name, other_blocks in other.series.items():
+            first_bucket, last_bucket = other.bounds[name]
+            blocks = self.series.setdefault(name, {})
+            for index, other_counts in other_blocks.items():
+                counts = blocks.get(index)
+                if counts is None:
+                    blocks[index] = array("Q", other_counts)
+                else:
+                    for offset, count in enumerate(other_counts):
+                        if count:
+                            counts[offset] += count
+            bounds = self.bounds.setdefault(name, [first_bucket, last_bucket])
+            bounds[0] = min(bounds[0], first_bucket)
+            bounds[1] = max(bounds[1], last_bucket)
+
+    def rows(self, names=None):
+        """
+        Yield a row for each bucket of the blocks with requests, between the
+        first and last bucket of all series: the start time (ISO format)
+        followed by the count for each series in `names` (all series by
+        default).
+        """
+
+        names = list(self.series) if names is None else names
+        series = [self.series.get(name, {}) for name in names]
+        bounds = [self.bounds[name] for name in names if name in self.bounds]
+        if not bounds:
+            return
+        first_bucket = min(b[0] for b in bounds)
+        last_bucket = max(b[1] for b in bounds)
+
+        for index in sorted(set().union(*series)):
+            start = max(index * BLOCK_SIZE, first_bucket)
+            end = min((index + 1) * BLOCK_SIZE, last_bucket + 1)
+            for bucket in range(start, end):
+                row = [
+                    datetime.fromtimestamp(
+                        bucket * self.bucket_size, tz=timezone.utc
+                    ).isoformat()
+                ]
+                offset = bucket - index * BLOCK_SIZE
+                for blocks in series:
+                    counts = blocks.get(index)
+                    row.append(counts[offset] if counts is not None else 0)
+                yield row
@@ -0,0 +1,49 @@
+"""
+Parsing of Heroku router lines, as saved from `heroku logs --tail`, e.g.
+
+2024-05-01T12:00:00.000000+00:00 heroku[router]: at=info method=GET
+path="/translate/" host=pontoon.mozilla.org request_id=... fwd="192.168.0.1"
+dyno=web.1 connect=0ms service=12ms status=200 bytes=1234 protocol=https
+
+Usage:
+    from router_log import parse_router_line
+
+    fields = parse_router_line(line)
+    if fields:
+        print(fields["path"], fields["service"])
+"""
+
+from heroku_json_log import forwarded_ip
+import re
+
+ROUTER_FIELDS = re.compile(r'(\w+)=("[^"]*"|\S*)')
+
+# Fields stored as integers, with the unit removed
+INTEGER_FIELDS = {"connect", "service", "status", "bytes"}
+
+
+def parse_router_line(line):
+    """
+    Return a dictionary with all key=value fields of a router line, or None if
+    the line is not a request handled by the router.
+    """
+
+    if "heroku[router]" not in line:
+        return None
+
+    fields = {}
+    for key, value in ROUTER_FIELDS.findall(line):
+        if value.startswith('"'):
+            value = value[1:-1]
+        elif key in INTEGER_FIELDS:
+            try:
+                value = int(value.removesuffix("ms"))
+            except ValueError:
+                pass
+        fields[key] = value
+
+    if "path" not in fields:
+        return None
+    fields["ip"] = forwarded_ip(fields.get("fwd", ""))
+
+    return fields
@@ -0,0 +1,103 @@
+"""
+This script can be used to rank clients (IPs) of Papertrail's archives in JSON
+(or native json.gz) format by how likely they are to be bots or abusive,
+combining request rate, path, user agent and status signals (see
+client_scoring.py).
+
+It prints the clients with the highest scores, and a comma-separated list of
+candidates that can be appended to the `BLOCKED_IPS` setting of the
+mozilla-pontoon app. IPs already blocked (see `BLOCKED_IP_SETTING` in
+blocked_ips.py) are excluded from candidates.
+
+Requires NumPy (`pip install numpy`).
+
+Usage:
+    python score_clients_heroku_json_log.py ~/path_to_logs
+    python score_clients_heroku_json_log.py --min-requests 500 --min-score 3 ~/path_to_logs
+"""
+
+from blocked_ips import BlockedIPs
+from client_scoring import scan_clients, score_clients
+from heroku_json_log import add_checkpoint_argument, find_archive_files
+import argparse
+import sys
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "log_path",
+        help="Path to folder with log file (.json Heroku format)",
+    )
+    parser.add_argument(
+        "--top",
+        required=False,
+        type=int,
+        default=50,
+        help="Number of clients to display",
+    )
+    parser.add_argument(
+        "--min-requests",
+        required=False,
+        type=int,
+        default=100,
+        help="Clients with fewer requests are ignored",
+    )
+    parser.add_argument(
+        "--min-score",
+        required=False,
+        type=float,
+        default=2.0,
+        help="Minimum score to include a client in block candidates",
+    )
+    parser.add_argument(
+        "--processes",
+        required=False,
+        type=int,
+        default=None,
+        help="Number of processes used to read archives (default: number of CPUs)",
+    )
+    add_checkpoint_argument(parser)
+    args = parser.parse_args()
+    log_path = args.log_path
+
+    archive_files = find_archive_files(log_path)
+    if not archive_files:
+        sys.exit(f"File {log_path} doesn't include any log file.")
+    else:
+        print(f"Found {len(archive_files)} log files.")
+
+    clients = scan_clients(
+        archive_files, args.processes, args.checkpoint, args.min_requests
+    )
+    ips, features, scores = score_clients(clients, args.min_requests)
+    if not ips:
+        sys.exit(f"No client with at least {args.min_requests} requests.")
+
+    blocked_ips = BlockedIPs()
+
+    print(
+        f"\n{'IP':<40} {'Score':>6} {'Requests':>9} {'Req/min':>8} {'Paths':>6} "
+        f"{'API':>5} {'HTML':>5} {'UA ent.':>7} {'4xx':>5}"
+    )
+    for ip, row, score in zip(ips[: args.top], features, scores):
+        requests, rate, paths, api, html, entropy, errors = row
+        label = f"{ip} (blocked)" if ip in blocked_ips else ip
+        print(
+            f"{label:<40} {score:>6.2f} {int(requests):>9} {rate:>8.1f} "
+            f"{int(paths):>6} {api:>5.0%} {html:>5.0%} {entropy:>7.2f} "
+            f"{errors:>5.0%}"
+        )
+
+    candidates = [
+        ip
+        for ip, score in zip(ips, scores)
+        if score >= args.min_score and ip not in blocked_ips
+    ]
+    print(f"\nBlock candidates (score >= {args.min_score}): {len(candidates)}")
+    if candidates:
+        print(",".join(candidates))
+
+
+if __name__ == "__main__":
+    main()
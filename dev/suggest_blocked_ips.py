@@ -0,0 +1,101 @@
+"""
+This script can be used to build a new value of the `BLOCKED_IPS` config var
+of the mozilla-pontoon app, adding IPs to the IPs and ranges already blocked
+(see `BLOCKED_IP_SETTING` in blocked_ips.py) and aggregating them into as few
+CIDR ranges as possible.
+
+IPs are read from a file (or stdin) with one IP per line, or from the output
+of the other scripts (`ip: count` or `ip (blocked): count`), keeping only IPs
+with at least `--threshold` requests.
+
+Aggregated ranges cover at most `--collateral` addresses that are neither
+listed nor already blocked. Ranges are never shorter than /16 for IPv4 and /48
+for IPv6 (see `MIN_PREFIXLEN` in blocked_ips.py).
+
+Usage:
+    python extract_ip_heroku_json_log.py ~/path_to_logs > ips.txt
+    python suggest_blocked_ips.py ips.txt
+    python suggest_blocked_ips.py --threshold 5000 --collateral 1024 ips.txt
+    python check_ips_heroku_log.py log.txt | python suggest_blocked_ips.py
+"""
+
+from blocked_ips import BlockedIPs, aggregate_networks, format_setting
+from ipaddress import ip_network
+import argparse
+import re
+import sys
+
+IP_LINE = re.compile(r"^([0-9A-Fa-f.:/]+)(?: \(blocked\))?(?::\s*(\d+))?$")
+
+
+def read_ips(lines, threshold):
+    networks = []
+    for line in lines:
+        match = IP_LINE.match(line.strip())
+        if not match:
+            continue
+        ip, count = match.groups()
+        if count is not None and int(count) < threshold:
+            continue
+        try:
+            networks.append(ip_network(ip, strict=False))
+        except ValueError:
+            continue
+
+    return networks
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "ip_file",
+        nargs="?",
+        help="File with IPs (one per line, or output of the other scripts), stdin if not set",
+    )
+    parser.add_argument(
+        "--threshold",
+        required=False,
+        type=int,
+        default=0,
+        help="Threshold under which IPs are ignored, when counts are available",
+    )
+    parser.add_argument(
+        "--collateral",
+        required=False,
+        type=int,
+        default=0,
+        help="Maximum number of addresses covered by ranges without being listed",
+    )
+    args = parser.parse_args()
+
+    if args.ip_file:
+        try:
+            with open(args.ip_file, "r") as f:
+                networks = read_ips(f, args.threshold)
+        except FileNotFoundError:
+            sys.exit(f"File {args.ip_file} not found.")
+    else:
+        networks = read_ips(sys.stdin, args.threshold)
+    if not networks:
+        sys.exit("No IP to block.")
+
+    blocked_ips = BlockedIPs()
+    new_networks = [
+        n
+        for n in networks
+        if n.num_addresses > 1 or not blocked_ips.contains_address(n.network_address)
+    ]
+    print(f"Found {len(networks)} IPs, {len(new_networks)} not blocked yet.")
+
+    aggregated, used = aggregate_networks(
+        blocked_ips.networks + new_networks, args.collateral
+    )
+    print(
+        f"BLOCKED_IPS: {len(blocked_ips.networks)} entries before, "
+        f"{len(aggregated)} after ({used} addresses not listed are covered).\n"
+    )
+    print(format_setting(aggregated))
+
+
+if __name__ == "__main__":
+    main()
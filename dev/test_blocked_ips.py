@@ -0,0 +1,90 @@
+"""
+Tests of blocked_ips.py.
+
+Usage:
+    python -m pytest test_blocked_ips.py
+"""
+
+from blocked_ips import aggregate_networks
+from ipaddress import ip_network
+import random
+
+
+def addresses(networks):
+    """Return the set of (version, address) covered by networks."""
+
+    return {
+        (network.version, int(network.network_address) + offset)
+        for network in networks
+        for offset in range(network.num_addresses)
+    }
+
+
+def supernet(address, min_prefixlen):
+    """Return the supernet of `min_prefixlen` of a (version, address)."""
+
+    version, value = address
+    bits = 32 if version == 4 else 128
+
+    return version, value >> (bits - min_prefixlen[version])
+
+
+def check_aggregation(networks, collateral, min_prefixlen):
+    aggregated, used = aggregate_networks(networks, collateral, min_prefixlen)
+    listed = addresses(networks)
+    covered = addresses(aggregated)
+
+    assert listed <= covered
+    assert used == len(covered - listed)
+    assert used <= collateral
+    # Aggregated networks don't overlap
+    assert sum(network.num_addresses for network in aggregated) == len(covered)
+    # Collateral addresses are in a supernet of `min_prefixlen` with listed
+    # addresses
+    listed_supernets = {supernet(address, min_prefixlen) for address in listed}
+    for address in covered - listed:
+        assert supernet(address, min_prefixlen) in listed_supernets
+
+    return aggregated, used
+
+
+def test_aggregate_networks_brute_force():
+    generator = random.Random(0)
+    min_prefixlen = {4: 24, 6: 120}
+    for _ in range(500):
+        networks = []
+        for _ in range(generator.randint(1, 30)):
+            # Single IPs and small ranges in a /24 (IPv4) or /120 (IPv6)
+            version, base = generator.choice(
+                [(4, "10.0.0.0"), (4, "10.0.1.0"), (6, "2001:db8::")]
+            )
+            bits = 32 if version == 4 else 128
+            prefixlen = generator.choice([bits] * 4 + [bits - 1, bits - 2, bits - 4])
+            offset = generator.randrange(256) & ~((1 << (bits - prefixlen)) - 1)
+            network = ip_network(f"{base}/{bits - 8}").network_address + offset
+            networks.append(ip_network(f"{network}/{prefixlen}"))
+        collateral = generator.choice([0, 1, 2, 5, 16, 50, 200, 1000])
+        check_aggregation(networks, collateral, min_prefixlen)
+
+
+def test_aggregate_networks_siblings():
+    # Leaves at 10.0.0.0, .1, .2 and .3 have two sibling candidates of the
+    # same prefix (/31) under a /30
+    networks = [ip_network(f"10.0.0.{i}") for i in (0, 1, 2, 3, 8, 10)]
+    min_prefixlen = {4: 16, 6: 48}
+
+    aggregated, used = check_aggregation(networks, 0, min_prefixlen)
+    assert aggregated == [
+        ip_network("10.0.0.0/30"),
+        ip_network("10.0.0.8/32"),
+        ip_network("10.0.0.10/32"),
+    ]
+    assert used == 0
+
+    aggregated, used = check_aggregation(networks, 2, min_prefixlen)
+    assert aggregated == [ip_network("10.0.0.0/30"), ip_network("10.0.0.8/30")]
+    assert used == 2
+
+    aggregated, used = check_aggregation(networks, 10, min_prefixlen)
+    assert aggregated == [ip_network("10.0.0.0/28")]
+    assert used == 10
@@ -0,0 +1,58 @@
+"""
+Tests of heavy_hitters.py.
+
+Usage:
+    python -m pytest test_heavy_hitters.py
+"""
+
+from collections import Counter
+from heavy_hitters import SpaceSaving
+import random
+
+
+def zipf_keys(generator, count, num_keys):
+    weights = [1 / (rank + 1) for rank in range(num_keys)]
+
+    return generator.choices(range(num_keys), weights, k=count)
+
+
+def check_bounds(summary, exact):
+    assert summary.total == sum(exact.values())
+    assert len(summary) <= summary.capacity
+    for key, count in summary.items():
+        # Never underestimated, overestimated by at most the error of the key
+        assert exact[key] <= count
+        assert count - exact[key] <= summary.errors[key] <= summary.max_error()
+    # Keys missing from the summary were seen at most floor() times
+    for key, count in exact.items():
+        if key not in summary:
+            assert count <= summary.floor()
+
+
+def test_space_saving():
+    generator = random.Random(0)
+    for capacity in (1, 10, 100):
+        summary = SpaceSaving(capacity)
+        exact = Counter()
+        for key in zipf_keys(generator, 5000, 1000):
+            summary[key] += 1
+            exact[key] += 1
+        check_bounds(summary, exact)
+        assert summary.max_error() <= summary.total / capacity
+
+
+def test_space_saving_merge():
+    generator = random.Random(1)
+    for capacity in (5, 50, 500):
+        merged = SpaceSaving(capacity)
+        exact = Counter()
+        for _ in range(4):
+            summary = SpaceSaving(capacity)
+            part = Counter(zipf_keys(generator, 3000, 800))
+            for key, count in part.items():
+                # Increments larger than 1, as in summaries of other keys
+                summary.add(key, count)
+            exact.update(part)
+            check_bounds(summary, part)
+            merged.update(summary)
+            check_bounds(merged, exact)
@@ -0,0 +1,57 @@
+"""
+Tests of heroku_log_index.py.
+
+Usage:
+    python -m pytest test_heroku_log_index.py
+"""
+
+from functools import partial
+from generate_heroku_logs import generate, generated_ip
+from heroku_json_log import (
+    extract_ip,
+    extract_path_for_ip,
+    extract_status,
+    extract_user_agent,
+    find_archive_files,
+    scan_archives,
+)
+from heroku_log_index import (
+    archive_ids,
+    count_ips,
+    count_paths_for_ip,
+    count_status,
+    count_user_agents,
+    ingest,
+    open_index,
+)
+
+
+def test_folders_sharing_index(tmp_path):
+    folders = []
+    for seed in range(2):
+        folder = tmp_path / f"logs{seed}"
+        generate(str(folder), 2000, num_ips=50, formats=["json"], seed=seed)
+        folders.append(find_archive_files(str(folder / "json")))
+
+    connection = open_index(str(tmp_path / "index.sqlite3"))
+    for archive_files in folders:
+        ingest(connection, archive_files, processes=1)
+
+    for archive_files in folders:
+        ip = generated_ip(0)
+        expected = scan_archives(
+            archive_files,
+            {
+                "ips": extract_ip,
+                "user_agents": extract_user_agent,
+                "status": extract_status,
+                "paths": partial(extract_path_for_ip, ip),
+            },
+            processes=1,
+        )
+        ids = archive_ids(connection, archive_files)
+        assert len(ids) == len(archive_files)
+        assert count_ips(connection, ids) == expected["ips"]
+        assert count_user_agents(connection, ids) == expected["user_agents"]
+        assert count_status(connection, ids) == expected["status"]
+        assert count_paths_for_ip(connection, ids, ip) == expected["paths"]
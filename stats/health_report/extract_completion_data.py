@@ -1,61 +1,101 @@
 #!/usr/bin/env python3
 
+"""
+Extract completion statistics for each locale across the main projects.
+
+Projects are read at the same time (see --concurrency), so the total time is
+close to the time needed to read the slowest project.
+
+Output as CSV file (output.csv by default, see --output and --format).
+
+Usage:
+    python extract_completion_data.py
+    python extract_completion_data.py --concurrency 8
+    python extract_completion_data.py --offline
+    python extract_completion_data.py --snapshot snapshot.jsonl
+    python extract_completion_data.py --output - --format ndjson
+"""
+
+import argparse
+import os
 import requests
 import sys
 
+# Shared Pontoon API client
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "API")
+)
+from pontoon_api import (  # noqa: E402
+    DEFAULT_CONCURRENCY,
+    add_cache_arguments,
+    create_client,
+)
+from report_output import add_output_arguments, open_report  # noqa: E402
+from snapshot import (  # noqa: E402
+    DEFAULT_PROJECTS,
+    load_snapshot,
+    read_localizations,
+)
+
 
 def main():
-    projects = [
-        "firefox-for-android",
-        "firefox-for-ios",
-        "firefox-relay-website",
-        "firefox",
-        "mozilla-accounts",
-        "mozilla-monitor-website",
-        "mozilla-vpn-client",
-    ]
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--concurrency",
+        required=False,
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help="Maximum number of requests sent at the same time",
+    )
+    parser.add_argument(
+        "--snapshot",
+        required=False,
+        help="Path to snapshot file (see snapshot.py) to read instead of the API",
+    )
+    add_cache_arguments(parser)
+    add_output_arguments(parser)
+    args = parser.parse_args()
+
+    projects = DEFAULT_PROJECTS
 
     # Get stats from Pontoon
-    locales_data = {}
-    for project in projects:
+    if args.snapshot:
+        snapshot = load_snapshot(args.snapshot)
+        projects_data = [snapshot.project_localizations(p) for p in projects]
+    else:
         try:
-            url = f"https://pontoon.mozilla.org/api/v2/projects/{project}/?fields=localizations"
-            page = 1
-            while url:
-                print(f"Reading data for {project} (page {page})")
-                response = requests.get(url)
-                response.raise_for_status()
-                data = response.json()
-
-                for locale_data in data.get("localizations", []):
-                    locale = locale_data["locale"]["code"]
-                    if locale not in locales_data:
-                        locales_data[locale] = {
-                            "projects": 0,
-                            "missing": 0,
-                            "approved": 0,
-                            "pretranslated": 0,
-                            "total": 0,
-                            "completion": 0,
-                        }
-                    locales_data[locale]["missing"] += locale_data["missing_strings"]
-                    locales_data[locale]["pretranslated"] += locale_data[
-                        "pretranslated_strings"
-                    ]
-                    locales_data[locale]["approved"] += (
-                        locale_data["approved_strings"]
-                        + locale_data["strings_with_warnings"]
-                    )
-                    locales_data[locale]["total"] += locale_data["total_strings"]
-                    locales_data[locale]["projects"] += 1
-
-                # Get the next page URL
-                url = data.get("next")
-                page += 1
+            with create_client(args, concurrency=args.concurrency) as client:
+                projects_data = client.map(
+                    lambda project: read_localizations(client, project), projects
+                )
         except requests.RequestException as e:
             print(f"Error fetching data: {e}")
             sys.exit()
 
+    # Aggregate in the order of projects, as if they were read one by one
+    locales_data = {}
+    for project_data in projects_data:
+        for locale_data in project_data:
+            locale = locale_data["locale"]
+            if locale not in locales_data:
+                locales_data[locale] = {
+                    "projects": 0,
+                    "missing": 0,
+                    "approved": 0,
+                    "pretranslated": 0,
+                    "total": 0,
+                    "completion": 0,
+                }
+            locales_data[locale]["missing"] += locale_data["missing_strings"]
+            locales_data[locale]["pretranslated"] += locale_data[
+                "pretranslated_strings"
+            ]
+            locales_data[locale]["approved"] += (
+                locale_data["approved_strings"] + locale_data["strings_with_warnings"]
+            )
+            locales_data[locale]["total"] += locale_data["total_strings"]
+            locales_data[locale]["projects"] += 1
+
     # Calculate completion percentage
     for locale in locales_data:
         if locales_data[locale]["total"] > 0:
@@ -67,18 +107,25 @@ def main():
         else:
             locales_data[locale]["completion"] = 0
 
-    output = []
-    output.append("Locale,Number of Projects,Completion,Approved strings,Total Strings")
-    for locale in sorted(list(locales_data.keys())):
-        locale_stats = locales_data[locale]
-        output.append(
-            f"{locale},{locale_stats['projects']},{locale_stats['completion']},{locale_stats['approved']},{locale_stats['total']}"
-        )
-
-    # Save locally
-    with open("output.csv", "w") as f:
-        f.write("\n".join(output))
-        print("Data stored as output.csv")
+    fields = [
+        "Locale",
+        "Number of Projects",
+        "Completion",
+        "Approved strings",
+        "Total Strings",
+    ]
+    with open_report(args, fields, [str, int, float, int, int]) as report:
+        for locale in sorted(locales_data):
+            locale_stats = locales_data[locale]
+            report.write(
+                [
+                    locale,
+                    locale_stats["projects"],
+                    locale_stats["completion"],
+                    locale_stats["approved"],
+                    locale_stats["total"],
+                ]
+            )
 
 
 if __name__ == "__main__":